@@ -0,0 +1,321 @@
+"""
+Incremental, per-account analysis backed by SQLite.
+
+Each account keeps its cleaned transactions, the merchant cluster of every
+description seen so far and, per candidate merchant, the feature row and
+summary the scorer needs. A new upload is deduplicated against the stored
+transactions; only the new rows are cleaned and clustered, and only the
+merchants they touch have their features recomputed from history. Every
+stored candidate is then rescored from its saved statistics, so a refresh
+costs time in the new rows plus the number of merchants, not the history.
+
+New descriptions join an existing merchant when they cluster with it. Two
+existing merchants are never merged afterwards, which a full re-analysis
+could do when a new name bridges them.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import traceback
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import config
+import metrics
+from columnar import TransactionColumns
+from ml_features import FEATURE_ORDER, array_to_features
+from pipeline import (
+    StatementError, _no_progress, build_response, describe_candidate, extract_candidate_features,
+    get_detector, normalize_merchant_names, read_transactions, subscription_mask
+)
+
+ACCOUNT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+# Parameters per IN (...) query, below SQLite's default limit
+SQL_BATCH = 500
+
+DAYS_SINCE_LAST = FEATURE_ORDER.index('days_since_last')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    account_id TEXT NOT NULL,
+    txn_key TEXT NOT NULL,
+    date INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    amount REAL NOT NULL,
+    merchant TEXT NOT NULL,
+    PRIMARY KEY (account_id, txn_key)
+);
+CREATE INDEX IF NOT EXISTS transactions_merchant ON transactions (account_id, merchant);
+CREATE TABLE IF NOT EXISTS merchant_names (
+    account_id TEXT NOT NULL,
+    description TEXT NOT NULL,
+    merchant TEXT NOT NULL,
+    PRIMARY KEY (account_id, description)
+);
+CREATE TABLE IF NOT EXISTS candidates (
+    account_id TEXT NOT NULL,
+    merchant TEXT NOT NULL,
+    features TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (account_id, merchant)
+);
+"""
+
+
+def is_valid_account_id(account_id: str) -> bool:
+    return bool(ACCOUNT_ID_PATTERN.match(account_id))
+
+
+def transaction_keys(df: pd.DataFrame) -> List[str]:
+    """
+    Stable identity of each raw row: date, narration, amount and how many
+    identical rows came before it, so a re-uploaded period matches exactly
+    while genuine same-day repeats stay distinct.
+    """
+    occurrence = df.groupby(['date', 'description', 'amount'], sort=False, dropna=False).cumcount()
+    seconds = epoch_seconds(df['date'])
+    return [
+        hashlib.sha1(f"{s}|{d}|{a!r}|{n}".encode('utf-8')).hexdigest()[:20]
+        for s, d, a, n in zip(seconds, df['description'].astype(str), df['amount'].astype(float), occurrence)
+    ]
+
+
+def epoch_seconds(dates: pd.Series) -> pd.Series:
+    # Whatever unit pandas parsed into (ns, us, s), store whole seconds
+    return dates.astype('datetime64[s]').astype('int64')
+
+
+def _batches(items: List, size: int = SQL_BATCH) -> Iterator[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class AccountStore:
+    def __init__(self, path: str = config.ACCOUNT_STORE_PATH):
+        self.path = path
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """One write transaction; concurrent updates of the store run one after another"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    # ============= TRANSACTIONS =============
+    def existing_keys(self, conn, account_id: str, keys: List[str]) -> set:
+        found = set()
+        for batch in _batches(keys):
+            rows = conn.execute(
+                f"SELECT txn_key FROM transactions WHERE account_id = ? AND txn_key IN ({','.join('?' * len(batch))})",
+                [account_id, *batch]
+            )
+            found.update(key for key, in rows)
+        return found
+
+    def insert_transactions(self, conn, account_id: str, df: pd.DataFrame):
+        seconds = epoch_seconds(df['date'])
+        conn.executemany(
+            "INSERT INTO transactions (account_id, txn_key, date, description, amount, merchant) VALUES (?, ?, ?, ?, ?, ?)",
+            zip([account_id] * len(df), df['txn_key'], seconds.tolist(), df['description'],
+                df['amount'].astype(float).tolist(), df['unified_merchant'])
+        )
+
+    def count_transactions(self, conn, account_id: str) -> int:
+        return conn.execute("SELECT COUNT(*) FROM transactions WHERE account_id = ?", (account_id,)).fetchone()[0]
+
+    def merchant_rows(self, conn, account_id: str, merchants: List[str]) -> pd.DataFrame:
+        """Full history of the given merchants in the columns extract_candidate_features expects"""
+        rows = []
+        for batch in _batches(merchants):
+            rows.extend(conn.execute(
+                f"SELECT date, description, amount, merchant FROM transactions "
+                f"WHERE account_id = ? AND merchant IN ({','.join('?' * len(batch))})",
+                [account_id, *batch]
+            ))
+        df = pd.DataFrame(rows, columns=['date', 'description', 'amount', 'unified_merchant'])
+        df['date'] = pd.to_datetime(df['date'], unit='s')
+        return df
+
+    # ============= MERCHANT CLUSTERS =============
+    def known_merchants(self, conn, account_id: str, descriptions: List[str]) -> Dict[str, str]:
+        known = {}
+        for batch in _batches(descriptions):
+            known.update(conn.execute(
+                f"SELECT description, merchant FROM merchant_names "
+                f"WHERE account_id = ? AND description IN ({','.join('?' * len(batch))})",
+                [account_id, *batch]
+            ))
+        return known
+
+    def account_merchants(self, conn, account_id: str) -> List[str]:
+        rows = conn.execute("SELECT DISTINCT merchant FROM merchant_names WHERE account_id = ?", (account_id,))
+        return [merchant for merchant, in rows]
+
+    def save_merchant_names(self, conn, account_id: str, mapping: Dict[str, str]):
+        conn.executemany(
+            "INSERT OR REPLACE INTO merchant_names (account_id, description, merchant) VALUES (?, ?, ?)",
+            [(account_id, desc, merchant) for desc, merchant in mapping.items()]
+        )
+
+    # ============= CANDIDATES =============
+    def save_candidates(self, conn, account_id: str, touched: Iterable[str], candidates: List[tuple]):
+        """Replace the candidates of the touched merchants with (merchant, feature row, summary)"""
+        conn.executemany("DELETE FROM candidates WHERE account_id = ? AND merchant = ?",
+                         [(account_id, merchant) for merchant in touched])
+        conn.executemany(
+            "INSERT INTO candidates (account_id, merchant, features, summary) VALUES (?, ?, ?, ?)",
+            [(account_id, merchant, json.dumps([float(v) for v in row]),
+              json.dumps({**summary, "last_date": summary["last_date"].isoformat()}))
+             for merchant, row, summary in candidates]
+        )
+
+    def load_candidates(self, conn, account_id: str) -> List[tuple]:
+        rows = conn.execute(
+            "SELECT merchant, features, summary FROM candidates WHERE account_id = ? ORDER BY merchant",
+            (account_id,)
+        )
+        candidates = []
+        for merchant, features, summary in rows:
+            summary = json.loads(summary)
+            summary["last_date"] = pd.Timestamp(summary["last_date"])
+            candidates.append((merchant, np.array(json.loads(features), dtype=float), summary))
+        return candidates
+
+    def delete_account(self, account_id: str) -> int:
+        """Forget an account; returns how many transactions were removed"""
+        with self.transaction() as conn:
+            removed = self.count_transactions(conn, account_id)
+            for table in ("transactions", "merchant_names", "candidates"):
+                conn.execute(f"DELETE FROM {table} WHERE account_id = ?", (account_id,))
+        return removed
+
+
+# ============= INCREMENTAL ANALYSIS =============
+def assign_merchants(store: AccountStore, conn, account_id: str, descriptions: List[str]) -> Dict[str, str]:
+    """Merchant for each cleaned description: stored if seen before, else clustered against the account's merchants"""
+    mapping = store.known_merchants(conn, account_id, descriptions)
+    unknown = [desc for desc in descriptions if desc not in mapping]
+    if not unknown:
+        return mapping
+
+    existing = set(store.account_merchants(conn, account_id))
+    clusters = get_detector().cluster_merchants(unknown + sorted(existing.difference(unknown)))
+
+    # Representative -> existing merchant in that cluster (alphabetically first, for determinism)
+    anchor: Dict[str, str] = {}
+    for desc, representative in clusters.items():
+        if desc in existing and (representative not in anchor or desc < anchor[representative]):
+            anchor[representative] = desc
+
+    learned = {desc: anchor.get(clusters[desc], clusters[desc]) for desc in unknown}
+    store.save_merchant_names(conn, account_id, learned)
+    mapping.update(learned)
+    return mapping
+
+
+def update_account(account_id: str, f: BinaryIO, progress: Optional[Callable[[str], None]] = None,
+                   store: Optional[AccountStore] = None) -> Dict:
+    """Add a statement to an account and return the /analyze payload for the whole account"""
+    store = store or AccountStore()
+    report = progress or _no_progress
+
+    report("parse")
+    metrics.start_stage("parse")
+    df = read_transactions(f)
+    metrics.count("rows", len(df))
+    df['txn_key'] = transaction_keys(df)
+
+    with store.transaction() as conn:
+        seen = store.existing_keys(conn, account_id, df['txn_key'].tolist())
+        new = df[~df['txn_key'].isin(seen)].copy()
+
+        report("clean")
+        metrics.start_stage("clean")
+        new['description'] = normalize_merchant_names(new['description'])
+
+        report("cluster")
+        metrics.start_stage("cluster")
+        mapping = assign_merchants(store, conn, account_id, new['description'].unique().tolist())
+        new['unified_merchant'] = new['description'].map(mapping)
+        store.insert_transactions(conn, account_id, new)
+
+        # Only merchants with new rows need their features rebuilt from history
+        report("score")
+        metrics.start_stage("features")
+        touched = pd.Series(new['unified_merchant'].unique(), dtype=object)
+        # Merchants whose name rules them out never need their history loaded
+        touched = touched[subscription_mask(touched).to_numpy()].tolist()
+        if touched:
+            history = TransactionColumns.from_frame(store.merchant_rows(conn, account_id, touched))
+            candidates, features_matrix = extract_candidate_features(history)
+            store.save_candidates(conn, account_id, touched, [
+                (merchant, row, summary)
+                for (merchant, summary, _), row in zip(candidates, features_matrix)
+            ])
+
+        stored = store.load_candidates(conn, account_id)
+        total = store.count_transactions(conn, account_id)
+    metrics.count("groups_scored", len(stored))
+    metrics.start_stage("score")
+
+    account = {
+        "account_id": account_id,
+        "new_transactions": len(new),
+        "duplicate_transactions": len(df) - len(new),
+        "total_transactions": total,
+        "merchants_updated": len(touched),
+    }
+    if total < 10:
+        return {"error": "Not enough valid transactions", "found_transactions": total, "account": account}
+
+    response = build_response(score_candidates(stored))
+    response["account"] = account
+    return response
+
+
+def score_candidates(stored: List[tuple]) -> List[Dict]:
+    """Rescore saved candidates as of now; only days_since_last changes between refreshes"""
+    if not stored:
+        return []
+    detector = get_detector()
+    now = pd.Timestamp.now()
+    matrix = np.vstack([row for _, row, _ in stored])
+    matrix[:, DAYS_SINCE_LAST] = [(now - summary["last_date"]).days for _, _, summary in stored]
+
+    ml_predictions, ml_scores = detector.detect_subscription_patterns(matrix)
+    detected_items = []
+    for (merchant, _, summary), row, ml_prediction, ml_score in zip(stored, matrix, ml_predictions, ml_scores):
+        item = describe_candidate(detector, merchant, summary, array_to_features(row), ml_prediction, ml_score)
+        if item is not None:
+            detected_items.append(item)
+    return detected_items
+
+
+def analyze_account_file(account_id: str, path: str, progress: Optional[Callable[[str], None]] = None) -> Dict:
+    """`update_account` for an upload spooled to disk; errors become response payloads"""
+    try:
+        with open(path, 'rb') as f:
+            return update_account(account_id, f, progress)
+    except StatementError as e:
+        return e.payload
+    except Exception as e:
+        traceback.print_exc()
+        metrics.record_error(e)
+        return {"error": f"Analysis failed: {str(e)}"}
@@ -0,0 +1,222 @@
+"""
+Analysis of many statements at once: POST /analyze/batch and a command-line runner.
+
+Both push files through an AnalysisEngine with a bounded number in flight and
+emit one JSON line per file as soon as it finishes (completion order):
+{"file": name, "result": <the /analyze payload>} or {"file": name, "error": message}.
+A file that cannot be read or analyzed only produces its own error line.
+
+The CLI runs one worker process per core by default. Each worker loads the
+models once and keeps its embedding cache across files, and the cache's disk
+tier is shared by all of them.
+
+Usage:
+    python batch.py statements/ customer.zip more.csv [--output results.jsonl] [--workers N]
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+import zipfile
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import config
+from engine import AnalysisEngine, EngineBusy
+from formats import is_statement_name
+from pipeline import analysis_version, analyze_statement_file
+from result_cache import ResultCache, result_key
+from uploads import TooManyFiles, UploadTooLarge, extract_statement_members, remove_spooled, spool_upload
+
+
+class BatchItem:
+    """One statement of a batch: a file to analyze, or the reason it cannot be"""
+
+    def __init__(self, name: str, path: Optional[str] = None, digest: Optional[str] = None,
+                 error: Optional[str] = None, spooled: bool = False):
+        self.name = name
+        self.path = path
+        # SHA-256 of the content, when known (result cache key)
+        self.digest = digest
+        self.error = error
+        # `path` is a temp copy, removed once the item is done
+        self.spooled = spooled
+
+
+async def analyze_item(engine: AnalysisEngine, item: BatchItem, cache: Optional[ResultCache] = None) -> Dict:
+    if item.error is not None:
+        return {"file": item.name, "error": item.error}
+
+    key = None
+    if cache is not None and cache.enabled and item.digest:
+        key = result_key(item.digest, analysis_version())
+        cached = cache.get(key)
+        if cached is not None:
+            return {"file": item.name, "result": cached}
+
+    try:
+        result = await engine.run(analyze_statement_file, item.path)
+    except EngineBusy:
+        return {"file": item.name, "error": "Server busy, retry this file."}
+    except Exception as e:
+        return {"file": item.name, "error": f"Analysis failed: {e}"}
+
+    if key is not None and "error" not in result:
+        cache.put(key, result)
+    return {"file": item.name, "result": result}
+
+
+async def analyze_batch(engine: AnalysisEngine, items: List[BatchItem], concurrency: int,
+                        cache: Optional[ResultCache] = None,
+                        on_done: Optional[Callable[[BatchItem], None]] = None) -> AsyncIterator[Dict]:
+    """Output lines for `items`, at most `concurrency` on the engine at a time; `on_done` runs per finished item"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(item: BatchItem) -> Dict:
+        try:
+            async with semaphore:
+                return await analyze_item(engine, item, cache)
+        finally:
+            if on_done is not None:
+                on_done(item)
+
+    tasks = [asyncio.ensure_future(run(item)) for item in items]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # The consumer went away (e.g. the client disconnected): drop what has not started
+        for task in tasks:
+            task.cancel()
+
+
+def remove_spooled_item(item: BatchItem):
+    if item.spooled and item.path:
+        remove_spooled(item.path)
+
+
+# ============= HTTP UPLOADS =============
+async def spool_batch(files, max_files: int = config.BATCH_MAX_FILES) -> List[BatchItem]:
+    """
+    Spool uploaded statements, and the statements inside uploaded zip archives,
+    to temp files. Oversized, unreadable or non-statement uploads become error items; more than
+    `max_files` statements raises TooManyFiles. The caller removes the files.
+    """
+    items: List[BatchItem] = []
+    try:
+        for file in files:
+            name = file.filename or "upload"
+            lower = name.lower()
+            if lower.endswith(".zip"):
+                items.extend(await _spool_archive(file, name, max_files - len(items)))
+            elif is_statement_name(name):
+                try:
+                    path, digest = await spool_upload(file)
+                    items.append(BatchItem(name, path, digest, spooled=True))
+                except UploadTooLarge as e:
+                    items.append(BatchItem(name, error=str(e)))
+            else:
+                items.append(BatchItem(name, error="Invalid file type. Upload statements (CSV, gzip CSV, "
+                                                   "Parquet, Arrow) or zip archives of them."))
+            if len(items) > max_files:
+                raise TooManyFiles(f"A batch holds at most {max_files} statements")
+    except BaseException:
+        for item in items:
+            remove_spooled_item(item)
+        raise
+    return items
+
+
+async def _spool_archive(file, name: str, max_files: int) -> List[BatchItem]:
+    try:
+        archive_path, _ = await spool_upload(file)
+    except UploadTooLarge as e:
+        return [BatchItem(name, error=str(e))]
+    try:
+        members = await asyncio.to_thread(extract_statement_members, archive_path, max(0, max_files))
+    except (zipfile.BadZipFile, UploadTooLarge) as e:
+        return [BatchItem(name, error=f"Could not unpack archive: {e}")]
+    finally:
+        remove_spooled(archive_path)
+    return [BatchItem(f"{name}/{member}", path, digest, spooled=True) for member, path, digest in members]
+
+
+# ============= COMMAND LINE =============
+def collect_items(inputs: List[str]) -> List[BatchItem]:
+    """Statements named directly, found under directories (recursively) or inside zip archives"""
+    items: List[BatchItem] = []
+    for source in inputs:
+        if os.path.isdir(source):
+            paths = sorted(path for path in glob.glob(os.path.join(source, "**", "*"), recursive=True)
+                           if is_statement_name(path) and not path.lower().endswith(".zip") and os.path.isfile(path))
+            items.extend(BatchItem(path, path) for path in paths)
+        elif source.lower().endswith(".zip"):
+            try:
+                members = extract_statement_members(source, max_files=sys.maxsize, max_bytes=sys.maxsize)
+            except (OSError, zipfile.BadZipFile) as e:
+                items.append(BatchItem(source, error=f"Could not unpack archive: {e}"))
+                continue
+            items.extend(BatchItem(f"{source}/{member}", path, spooled=True) for member, path, _ in members)
+        elif os.path.isfile(source):
+            items.append(BatchItem(source, source))
+        else:
+            items.append(BatchItem(source, error="No such file or directory"))
+    return items
+
+
+async def run_cli(items: List[BatchItem], output, workers: int) -> Dict[str, int]:
+    slots = workers or config.ANALYSIS_THREADS
+    # Two files per worker keep every core busy while results travel back
+    concurrency = max(1, slots) * 2
+    engine = AnalysisEngine(workers=workers, max_pending=concurrency)
+    engine.warm_up()
+
+    counts = {"analyzed": 0, "rejected": 0, "failed": 0}
+    try:
+        async for line in analyze_batch(engine, items, concurrency, on_done=remove_spooled_item):
+            if "error" in line:
+                counts["failed"] += 1
+            elif "error" in line["result"]:
+                counts["rejected"] += 1
+            else:
+                counts["analyzed"] += 1
+            output.write(json.dumps(line) + "\n")
+            output.flush()
+    finally:
+        for item in items:
+            remove_spooled_item(item)
+        engine.shutdown()
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Analyze many statements and write one JSON line per file")
+    parser.add_argument("inputs", nargs="+", help="Statement files, directories of them or zip archives")
+    parser.add_argument("--output", default="-", help="JSON Lines file ('-': standard output)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes, each with its own models (0: threads in this process)")
+    args = parser.parse_args(argv)
+
+    items = collect_items(args.inputs)
+    if not items:
+        print("No statement files found", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        counts = asyncio.run(run_cli(items, output, args.workers))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"{len(items)} files in {elapsed:.1f}s ({len(items) / elapsed:.1f}/s): {counts['analyzed']} analyzed, "
+          f"{counts['rejected']} rejected, {counts['failed']} failed", file=sys.stderr)
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
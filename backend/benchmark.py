@@ -0,0 +1,227 @@
+"""
+Pipeline benchmark on synthetic statements of increasing size.
+
+Generates statements with synthetic_data.generate_scaled_statement (cached as
+CSV under .cache/benchmark), runs the analysis stage by stage and records wall
+time and peak traced memory per stage. Results go to a JSON file; pass a
+previous file as --baseline to flag stages that got slower.
+
+Usage:
+    python benchmark.py [--sizes 1000,10000,100000,1000000] [--layouts default|all|hdfc,sbi]
+                        [--repeat 1] [--output benchmark_results.json]
+                        [--baseline old.json] [--threshold 1.2] [--no-memory]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import config
+from pipeline import (
+    _clean_upper_merchant_name, analysis_version, build_response, cluster_columns, describe_candidate,
+    extract_candidate_features, get_detector, merchant_name_codes, read_transactions
+)
+from synthetic_data import STATEMENT_LAYOUTS, generate_scaled_statement
+
+BENCHMARK_DIR = os.path.join(config.CACHE_DIR, "benchmark")
+STAGES = ["parse", "clean", "cluster", "features", "score"]
+
+
+def statement_file(rows: int, layout: str, seed: int) -> Tuple[str, List[str]]:
+    """Path of a generated statement (created on first use) and its subscription names"""
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    base = os.path.join(BENCHMARK_DIR, f"statement_{rows}_{layout}_{seed}")
+    if not os.path.exists(base + ".csv"):
+        print(f"Generating {rows:,} rows ({layout})...")
+        df, subscriptions = generate_scaled_statement(rows, layout=layout, seed=seed)
+        tmp_path = base + ".csv.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(line + "\n" for line in STATEMENT_LAYOUTS[layout]["preamble"])
+            df.to_csv(f, index=False, float_format="%.2f")
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump({"subscriptions": subscriptions}, f)
+        os.replace(tmp_path, base + ".csv")
+    with open(base + ".json", encoding="utf-8") as f:
+        return base + ".csv", json.load(f)["subscriptions"]
+
+
+def run_stages(path: str, measure: Callable[[str, Callable], object]) -> Dict:
+    """The analysis pipeline split into STAGES; `measure(stage, fn)` runs and records each one"""
+    detector = get_detector()
+
+    def parse():
+        with open(path, "rb") as f:
+            return read_transactions(f)
+    df = measure("parse", parse)
+
+    name_codes, names = measure("clean", partial(merchant_name_codes, df["description"]))
+
+    def cluster(frame: pd.DataFrame):
+        return cluster_columns(frame, name_codes, names, detector.cluster_merchants(names.tolist()))
+    columns = measure("cluster", partial(cluster, df))
+    # The row-level frame is not needed past clustering; free it before the features stage
+    del df
+
+    candidates, features_matrix = measure("features", lambda: extract_candidate_features(columns))
+
+    def score():
+        predictions, scores = detector.detect_subscription_patterns(features_matrix)
+        items = [describe_candidate(detector, merchant, summary, features, prediction, score)
+                 for (merchant, summary, features), prediction, score in zip(candidates, predictions, scores)]
+        return build_response([item for item in items if item is not None])
+    return measure("score", score)
+
+
+def time_run(path: str) -> Tuple[Dict[str, float], Dict]:
+    timings: Dict[str, float] = {}
+
+    def measure(stage: str, fn: Callable):
+        start = time.perf_counter()
+        result = fn()
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    _clean_upper_merchant_name.cache_clear()
+    response = run_stages(path, measure)
+    return timings, response
+
+
+def memory_run(path: str) -> Dict[str, float]:
+    """Peak traced allocation per stage, in MB (a separate pass: tracing slows Python code down)"""
+    peaks: Dict[str, float] = {}
+
+    def measure(stage: str, fn: Callable):
+        tracemalloc.reset_peak()
+        result = fn()
+        peaks[stage] = tracemalloc.get_traced_memory()[1] / 2**20
+        return result
+
+    _clean_upper_merchant_name.cache_clear()
+    tracemalloc.start()
+    try:
+        run_stages(path, measure)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def benchmark(rows: int, layout: str, seed: int, repeat: int, memory: bool) -> Dict:
+    path, expected = statement_file(rows, layout, seed)
+
+    runs = [time_run(path) for _ in range(repeat)]
+    # Best of the repeats for each stage: the least disturbed measurement
+    stages = {stage: {"seconds": round(min(t[stage] for t, _ in runs), 4)} for stage in STAGES}
+    if memory:
+        for stage, peak in memory_run(path).items():
+            stages[stage]["peak_mb"] = round(peak, 1)
+
+    response = runs[0][1]
+    detected = {item["UnifiedName"].upper() for item in response.get("subscriptions", [])}
+    found = [name for name in expected if name in detected]
+    return {
+        "rows": rows,
+        "layout": layout,
+        "seed": seed,
+        "file_mb": round(os.path.getsize(path) / 2**20, 1),
+        "stages": stages,
+        "total_seconds": round(sum(s["seconds"] for s in stages.values()), 4),
+        "expected_subscriptions": len(expected),
+        "found_subscriptions": len(found),
+        "reported_items": len(detected),
+    }
+
+
+def environment() -> Dict:
+    import sklearn
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "text_backend": config.TEXT_BACKEND,
+        "analysis_version": analysis_version(),
+    }
+
+
+def compare(results: List[Dict], baseline: List[Dict], threshold: float) -> List[str]:
+    """Stages at least `threshold` times slower than in the baseline run of the same statement"""
+    previous = {(r["rows"], r["layout"], r["seed"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get((result["rows"], result["layout"], result["seed"]))
+        if old is None:
+            continue
+        for stage, new_stage in result["stages"].items():
+            old_seconds = old["stages"].get(stage, {}).get("seconds")
+            # Sub-10ms stages are mostly noise
+            if not old_seconds or max(old_seconds, new_stage["seconds"]) < 0.01:
+                continue
+            ratio = new_stage["seconds"] / old_seconds
+            marker = "  <-- slower" if ratio >= threshold else ""
+            print(f"  {result['rows']:>9,} {result['layout']:<8} {stage:<9} "
+                  f"{old_seconds:8.3f}s -> {new_stage['seconds']:8.3f}s  x{ratio:.2f}{marker}")
+            if ratio >= threshold:
+                regressions.append(f"{result['rows']} {result['layout']} {stage}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic statements")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000", help="Comma-separated row counts")
+    parser.add_argument("--layouts", default="default", help="'all' or comma-separated STATEMENT_LAYOUTS names")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per statement (best is kept)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio reported as a regression")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the traced-memory pass")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    layouts = list(STATEMENT_LAYOUTS) if args.layouts == "all" else args.layouts.split(",")
+
+    get_detector().warm_up()
+    results = []
+    for rows in sizes:
+        for layout in layouts:
+            result = benchmark(rows, layout, args.seed, args.repeat, not args.no_memory)
+            results.append(result)
+            stages = "  ".join(f"{stage} {s['seconds']:.3f}s" for stage, s in result["stages"].items())
+            print(f"{rows:>9,} {layout:<8} total {result['total_seconds']:.3f}s  {stages}  "
+                  f"found {result['found_subscriptions']}/{result['expected_subscriptions']}")
+
+    report = {
+        "environment": environment(),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        print(f"Compared with {args.baseline}:")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than x{args.threshold}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Compact columnar form of a cleaned, merchant-clustered statement.
+
+Once merchant names are clean, every row is reduced to fixed-width arrays:
+int32 codes into the merchant and cleaned-description name tables, int32 days
+since the epoch and the amount. Rows are sorted by merchant, then date, so
+each merchant is one contiguous run `offsets[i]:offsets[i + 1]` and feature
+code can use whole-array reductions instead of per-group DataFrames.
+"""
+import numpy as np
+import pandas as pd
+
+
+def epoch_days(dates) -> np.ndarray:
+    """Whole days since 1970-01-01 of a datetime Series or array, as int32"""
+    return np.asarray(dates, dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64).astype(np.int32)
+
+
+def day_of_month(days: np.ndarray) -> np.ndarray:
+    """1-31 day of the month of epoch days"""
+    dates = np.asarray(days, dtype=np.int64).astype("datetime64[D]")
+    return (dates - dates.astype("datetime64[M]")).astype(np.int64) + 1
+
+
+class TransactionColumns:
+    """
+    Transactions as parallel arrays grouped by merchant.
+
+    `merchants` and `descriptions` are object arrays of names; rows refer to
+    them through `merchant_codes` and `description_codes`. Merchant names are
+    kept in sorted order, so groups come out in the same order as a sort of
+    the old frame by merchant name. Amounts stay float64: float32 cannot hold
+    rupee amounts to the paisa above ~1.6 lakh and would change reported totals.
+    """
+
+    def __init__(self, merchants, merchant_codes, descriptions, description_codes, days, amounts,
+                 presorted: bool = False):
+        merchants = np.asarray(merchants, dtype=object)
+        merchant_codes = np.asarray(merchant_codes, dtype=np.int32)
+        description_codes = np.asarray(description_codes, dtype=np.int32)
+        days = np.asarray(days, dtype=np.int32)
+        amounts = np.asarray(amounts, dtype=np.float64)
+
+        if not presorted:
+            # Renumber merchants in name order, then sort rows by (merchant, date);
+            # lexsort is stable, so same-day rows keep their statement order
+            name_order = np.argsort(merchants, kind="stable")
+            rank = np.empty(len(merchants), dtype=np.int32)
+            rank[name_order] = np.arange(len(merchants), dtype=np.int32)
+            merchants = merchants[name_order]
+            merchant_codes = rank[merchant_codes]
+            order = np.lexsort((days, merchant_codes))
+            merchant_codes, description_codes = merchant_codes[order], description_codes[order]
+            days, amounts = days[order], amounts[order]
+
+        self.merchants = merchants
+        self.merchant_codes = merchant_codes
+        self.descriptions = np.asarray(descriptions, dtype=object)
+        self.description_codes = description_codes
+        self.days = days
+        self.amounts = amounts
+        # Group i is rows offsets[i]:offsets[i + 1]; merchants without rows are empty runs
+        self.offsets = np.zeros(len(merchants) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(merchant_codes, minlength=len(merchants)), out=self.offsets[1:])
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "TransactionColumns":
+        """From a frame with 'date', 'description', 'amount' and 'unified_merchant' columns"""
+        merchant_codes, merchants = pd.factorize(df['unified_merchant'])
+        description_codes, descriptions = pd.factorize(df['description'])
+        return cls(merchants.to_numpy(dtype=object), merchant_codes, descriptions.to_numpy(dtype=object),
+                   description_codes, epoch_days(df['date']), df['amount'].to_numpy(dtype=np.float64))
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def group_sizes(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def take_groups(self, mask: np.ndarray) -> "TransactionColumns":
+        """Only the merchants where `mask` (one bool per merchant) is set, still sorted"""
+        keep_rows = mask[self.merchant_codes]
+        renumber = np.cumsum(mask, dtype=np.int32) - 1
+        return TransactionColumns(
+            self.merchants[mask], renumber[self.merchant_codes[keep_rows]], self.descriptions,
+            self.description_codes[keep_rows], self.days[keep_rows], self.amounts[keep_rows],
+            presorted=True,
+        )
+
+    def nbytes(self) -> int:
+        """Bytes held by the per-row arrays"""
+        return sum(a.nbytes for a in (self.merchant_codes, self.description_codes, self.days, self.amounts))
+
+    def to_frame(self) -> pd.DataFrame:
+        """Back to the sorted row-per-transaction frame (for debugging and export)"""
+        return pd.DataFrame({
+            'date': pd.to_datetime(self.days.astype(np.int64), unit='D'),
+            'description': self.descriptions[self.description_codes],
+            'amount': self.amounts,
+            'unified_merchant': self.merchants[self.merchant_codes],
+        })
@@ -0,0 +1,105 @@
+import os
+
+# ============= PATHS =============
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.getenv("SUBDETECT_CACHE_DIR", os.path.join(BACKEND_DIR, ".cache"))
+
+# ============= EMBEDDINGS =============
+# "transformer" (sentence-transformers, needs torch) or "lite" (char n-gram TF-IDF)
+TEXT_BACKEND = os.getenv("SUBDETECT_TEXT_BACKEND", "transformer")
+TEXT_MODEL_NAME = os.getenv("SUBDETECT_TEXT_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_CACHE_DIR = os.getenv("SUBDETECT_EMBEDDING_CACHE_DIR", os.path.join(CACHE_DIR, "embeddings"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("SUBDETECT_EMBEDDING_CACHE_SIZE", "20000"))
+# Encode calls from concurrent analyses are flushed as one batch at this many
+# texts, or after this much added latency, whichever comes first. Batches only
+# combine analyses that share a model, i.e. thread mode (ANALYSIS_WORKERS=0,
+# as in serve.py workers) with ANALYSIS_THREADS > 1; everywhere else the engine
+# sets the wait to 0, since each pool process runs one analysis at a time
+ENCODE_BATCH_MAX_SIZE = int(os.getenv("SUBDETECT_ENCODE_BATCH_MAX_SIZE", "256"))
+ENCODE_BATCH_MAX_WAIT_MS = float(os.getenv("SUBDETECT_ENCODE_BATCH_MAX_WAIT_MS", "10"))
+
+# ============= INGESTION =============
+# Uploads are spooled to disk (UPLOAD_SPOOL_DIR, default: system temp) and parsed in chunks
+UPLOAD_SPOOL_DIR = os.getenv("SUBDETECT_UPLOAD_SPOOL_DIR") or None
+MAX_UPLOAD_BYTES = int(float(os.getenv("SUBDETECT_MAX_UPLOAD_MB", "100")) * 1024 * 1024)
+MAX_STATEMENT_ROWS = int(os.getenv("SUBDETECT_MAX_STATEMENT_ROWS", "2000000"))
+CSV_CHUNK_ROWS = int(os.getenv("SUBDETECT_CSV_CHUNK_ROWS", "50000"))
+# Lines searched for the column header row (bank preambles come before it)
+HEADER_SCAN_LINES = int(os.getenv("SUBDETECT_HEADER_SCAN_LINES", "100"))
+# Learned bank layouts (header fingerprint -> columns and date format); empty keeps them in memory only
+LAYOUT_REGISTRY_PATH = os.getenv("SUBDETECT_LAYOUT_REGISTRY", os.path.join(CACHE_DIR, "layouts.json"))
+LAYOUT_REGISTRY_SIZE = int(os.getenv("SUBDETECT_LAYOUT_REGISTRY_SIZE", "500"))
+
+# ============= RESULT CACHE =============
+# Complete /analyze responses keyed by upload hash + analysis version; 0 disables the memory tier
+RESULT_CACHE_SIZE = int(os.getenv("SUBDETECT_RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL = int(os.getenv("SUBDETECT_RESULT_CACHE_TTL", "3600"))
+# Responses contain transaction details, so the disk tier is opt-in
+RESULT_CACHE_DIR = os.getenv("SUBDETECT_RESULT_CACHE_DIR") or None
+
+# ============= ACCOUNTS =============
+# SQLite store behind incremental /accounts/{id}/analyze
+ACCOUNT_STORE_PATH = os.getenv("SUBDETECT_ACCOUNT_STORE", os.path.join(CACHE_DIR, "accounts.sqlite3"))
+
+# ============= PATTERN MODEL =============
+# Minimum merchant groups in the corpus train_model.py fits the pattern model on
+PATTERN_MIN_FIT_SAMPLES = int(os.getenv("SUBDETECT_PATTERN_MIN_FIT_SAMPLES", "20"))
+PATTERN_MODEL_DIR = os.getenv("SUBDETECT_PATTERN_MODEL_DIR", os.path.join(BACKEND_DIR, "models"))
+# Pin a specific artifact version (e.g. "3"); empty means the newest one on disk
+PATTERN_MODEL_VERSION = os.getenv("SUBDETECT_PATTERN_MODEL_VERSION", "")
+
+# ============= MERCHANT NAMES =============
+# Raw narration -> clean merchant name memo shared across requests
+MERCHANT_NAME_MEMO_SIZE = int(os.getenv("SUBDETECT_MERCHANT_NAME_MEMO_SIZE", "100000"))
+
+# ============= WORKERS =============
+# Analysis worker processes; 0 runs analyses on threads in the server process instead
+ANALYSIS_WORKERS = int(os.getenv("SUBDETECT_ANALYSIS_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Threads used when ANALYSIS_WORKERS is 0; they share one model, and encode
+# batching only combines requests when this is above 1
+ANALYSIS_THREADS = int(os.getenv("SUBDETECT_ANALYSIS_THREADS", "1"))
+# Analyses allowed in flight (running + queued) before new uploads get 503
+ANALYSIS_MAX_PENDING = int(os.getenv("SUBDETECT_ANALYSIS_MAX_PENDING",
+                                     str((ANALYSIS_WORKERS or ANALYSIS_THREADS) * 4)))
+# Load models in every worker at start-up instead of on the first request
+WARMUP_ON_START = os.getenv("SUBDETECT_WARMUP_ON_START", "1") == "1"
+# "spawn" keeps torch's threads out of forked children
+ANALYSIS_START_METHOD = os.getenv("SUBDETECT_ANALYSIS_START_METHOD", "spawn")
+
+# ============= JOBS =============
+# Jobs waiting for a runner before POST /jobs starts returning 503
+JOB_MAX_QUEUED = int(os.getenv("SUBDETECT_JOB_MAX_QUEUED", "100"))
+# Jobs analyzed at the same time (each occupies one analysis worker)
+JOB_CONCURRENCY = int(os.getenv("SUBDETECT_JOB_CONCURRENCY", str(ANALYSIS_WORKERS or ANALYSIS_THREADS)))
+# Seconds a finished job's result is kept before eviction
+JOB_RESULT_TTL = int(os.getenv("SUBDETECT_JOB_RESULT_TTL", "3600"))
+# Hard cap on finished jobs held in memory; the oldest are evicted first
+JOB_MAX_STORED = int(os.getenv("SUBDETECT_JOB_MAX_STORED", "1000"))
+
+# ============= BATCH =============
+# Files analyzed at the same time for one POST /analyze/batch request
+BATCH_CONCURRENCY = int(os.getenv("SUBDETECT_BATCH_CONCURRENCY", str(ANALYSIS_WORKERS or ANALYSIS_THREADS)))
+# Statements per batch request, counting the CSVs inside zip archives
+BATCH_MAX_FILES = int(os.getenv("SUBDETECT_BATCH_MAX_FILES", "1000"))
+
+# ============= SERVING =============
+# serve.py: HTTP worker processes forked from a parent that has loaded the models
+SERVE_WORKERS = int(os.getenv("SUBDETECT_SERVE_WORKERS", str(os.cpu_count() or 1)))
+SERVE_HOST = os.getenv("SUBDETECT_SERVE_HOST", "0.0.0.0")
+SERVE_PORT = int(os.getenv("SUBDETECT_SERVE_PORT", "8000"))
+
+# ============= CLUSTERING =============
+# From this many unique merchant names, only names sharing a blocking key
+# (first characters of the first word) are compared with each other
+CLUSTER_BLOCKING_THRESHOLD = int(os.getenv("SUBDETECT_CLUSTER_BLOCKING_THRESHOLD", "2000"))
+# Cosine distance threshold for the lite backend's char n-gram vectors. Tiers sit
+# close to their base brand (SWIGGY ONE ~ SWIGGY at 0.18, AMAZON PRIME ~ AMAZON
+# at 0.28), so only near-identical spellings may merge
+LITE_CLUSTER_EPS = float(os.getenv("SUBDETECT_LITE_CLUSTER_EPS", "0.15"))
+
+# ============= PERIODICITY =============
+# Lowest score (share of intervals on the period x share of expected payments
+# made) for a merchant to get a dominant period
+PERIOD_MIN_REGULARITY = float(os.getenv("SUBDETECT_PERIOD_MIN_REGULARITY", "0.6"))
+# Missed payments in a row that an interval may span and still fit the period
+PERIOD_MAX_SKIP = int(os.getenv("SUBDETECT_PERIOD_MAX_SKIP", "3"))
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: appends from several processes are not serialized
+    fcntl = None
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for merchant embeddings.
+
+    Tier 1 is an in-process LRU bounded by `max_items`. Tier 2 is an on-disk
+    store: a raw float32 matrix (memory-mapped for reads) plus a key file
+    where line i holds the content hash of row i. Both files are append-only,
+    so a reader that sees key i is guaranteed to find vector i on disk.
+    Processes sharing the directory take a file lock to append. Memory-tier
+    entries for rows on disk hold only the row number and are read from the
+    current memory map, so workers share those pages instead of each holding
+    a copy, and the map can be replaced as the file grows without old
+    mappings (and their file descriptors) being kept alive.
+    """
+
+    VECTORS_FILE = "vectors.f32"
+    KEYS_FILE = "keys.txt"
+    META_FILE = "meta.json"
+    LOCK_FILE = "append.lock"
+
+    def __init__(self, cache_dir: Optional[str], model_name: str, max_items: int = 20000):
+        self.model_name = model_name
+        self.max_items = max_items
+        self.cache_dir = None
+        if cache_dir:
+            # Namespace by model so switching models never mixes vectors
+            safe_name = model_name.replace("/", "_")
+            self.cache_dir = os.path.join(cache_dir, safe_name)
+
+        # Key -> row on disk, or the vector itself while it is not persisted
+        self._memory: "OrderedDict[str, Union[int, np.ndarray]]" = OrderedDict()
+        self._index: Dict[str, int] = {}
+        # Key lines read so far (= rows); can exceed len(_index) if a key was appended twice
+        self._rows = 0
+        self._keys_offset = 0
+        self._matrix = None
+        self._dim = None
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._load_meta()
+                self._refresh_index()
+            except OSError as e:
+                print(f"Warning: Embedding cache disk tier disabled: {e}")
+                self.cache_dir = None
+
+    # ============= PUBLIC API =============
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Return embeddings for `texts`, encoding only strings not found in either tier"""
+        if len(texts) == 0:
+            return np.zeros((0, self._dim or 0), dtype=np.float32)
+
+        keys = [self._key(t) for t in texts]
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+
+        with self._lock:
+            disk_lookup = []
+            for i, key in enumerate(keys):
+                vec = self._memory_vector(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    vectors[i] = vec
+                    self.memory_hits += 1
+                else:
+                    disk_lookup.append(i)
+
+            if disk_lookup and self.cache_dir:
+                if any(keys[i] not in self._index for i in disk_lookup):
+                    # Another process may have appended since we last looked
+                    self._refresh_index()
+
+            for i in disk_lookup:
+                key = keys[i]
+                vec = self._disk_vector(key)
+                if vec is not None:
+                    vectors[i] = vec
+                    self._remember(key, self._index[key])
+                    self.disk_hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+
+        if missing:
+            unique_positions = [positions[0] for positions in missing.values()]
+            new_vectors = np.asarray(encode_fn([texts[i] for i in unique_positions]), dtype=np.float32)
+            with self._lock:
+                self.misses += len(unique_positions)
+                new_keys = list(missing.keys())
+                for key, vec in zip(new_keys, new_vectors):
+                    self._remember(key, vec)
+                    for i in missing[key]:
+                        vectors[i] = vec
+                if self.cache_dir:
+                    self._append(new_keys, new_vectors)
+                    # Keep the shared on-disk copies rather than private ones
+                    for key in new_keys:
+                        if self._disk_vector(key) is not None:
+                            self._remember(key, self._index[key])
+
+        return np.vstack(vectors).astype(np.float32, copy=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for monitoring"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "disk_items": len(self._index),
+        }
+
+    # ============= INTERNALS =============
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _disk_vector(self, key: str) -> Optional[np.ndarray]:
+        """View of the key's row in the memory map (no copy), if it is on disk"""
+        return self._row_vector(self._index.get(key))
+
+    def _row_vector(self, row: Optional[int]) -> Optional[np.ndarray]:
+        if row is None or self._matrix is None or row >= len(self._matrix):
+            return None
+        return np.asarray(self._matrix[row])
+
+    def _memory_vector(self, key: str) -> Optional[np.ndarray]:
+        """The key's vector if it is in the memory tier"""
+        entry = self._memory.get(key)
+        if isinstance(entry, int):
+            return self._row_vector(entry)
+        return entry
+
+    def _remember(self, key: str, vec: Union[int, np.ndarray]):
+        """Add to the memory tier: a row number for vectors on disk, else the vector"""
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _load_meta(self):
+        meta_path = self._path(self.META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self._dim = meta.get("dim")
+
+    def _write_meta(self):
+        tmp_path = self._path(self.META_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"model": self.model_name, "dim": self._dim}, f)
+        os.replace(tmp_path, self._path(self.META_FILE))
+
+    def _refresh_index(self):
+        """Pick up keys appended to disk (by us or another process) since the last read"""
+        keys_path = self._path(self.KEYS_FILE)
+        if not os.path.exists(keys_path) or self._dim is None:
+            return
+
+        with open(keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            chunk = f.read()
+        # Ignore a trailing partial line from a concurrent writer
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            self._index.setdefault(line.decode("ascii"), self._rows)
+            self._rows += 1
+        self._keys_offset += end
+
+        vectors_path = self._path(self.VECTORS_FILE)
+        n_rows = os.path.getsize(vectors_path) // (4 * self._dim) if os.path.exists(vectors_path) else 0
+        if n_rows > 0 and (self._matrix is None or len(self._matrix) != n_rows):
+            self._matrix = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(n_rows, self._dim))
+
+    @contextmanager
+    def _append_lock(self):
+        """Exclusive across processes: keys and vectors of one append must land as consecutive rows"""
+        if fcntl is None:
+            yield
+            return
+        with open(self._path(self.LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _append(self, keys: List[str], vectors: np.ndarray):
+        try:
+            with self._append_lock():
+                if self._dim is None:
+                    self._load_meta()
+                if self._dim is None:
+                    self._dim = int(vectors.shape[1])
+                    self._write_meta()
+                elif vectors.shape[1] != self._dim:
+                    print(f"Warning: Embedding dim changed ({self._dim} -> {vectors.shape[1]}), not persisting")
+                    return
+
+                # Another worker may have stored some of these while we were encoding
+                self._refresh_index()
+                new = [i for i, key in enumerate(keys) if key not in self._index]
+                if not new:
+                    return
+
+                vectors_path = self._path(self.VECTORS_FILE)
+                row_bytes = 4 * self._dim
+                if os.path.exists(vectors_path) and os.path.getsize(vectors_path) > self._rows * row_bytes:
+                    # Rows of an append that died before writing its keys
+                    os.truncate(vectors_path, self._rows * row_bytes)
+
+                # Vectors first, keys second: a visible key always has its row on disk
+                with open(vectors_path, "ab") as f:
+                    f.write(np.ascontiguousarray(vectors[new], dtype=np.float32).tobytes())
+                with open(self._path(self.KEYS_FILE), "ab") as f:
+                    f.write("".join(keys[i] + "\n" for i in new).encode("ascii"))
+            self._refresh_index()
+        except OSError as e:
+            print(f"Warning: Failed to persist embeddings: {e}")
@@ -0,0 +1,121 @@
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from metrics import BATCH_SIZE_BUCKETS, HistogramData
+
+
+class _EncodeRequest:
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.result: Optional[np.ndarray] = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class EncodeBatcher:
+    """
+    Micro-batches encode calls from concurrent analyses.
+
+    Callers block in `encode` while a single background thread gathers their
+    requests and flushes them as one model batch once `max_batch_size` texts
+    are queued or `max_wait_ms` has passed since the first request of the
+    batch, then scatters the vectors back. Only that thread calls the model.
+    Requests only combine when several analyses run on threads of the process
+    that owns the batcher; where only one can run at a time, use
+    `max_wait_ms=0` so the lone request is not delayed.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray],
+                 max_batch_size: int = 256, max_wait_ms: float = 10.0):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[_EncodeRequest]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+        self.batches = 0
+        self.requests = 0
+        self.texts = 0
+        self.last_batch_size = 0
+        self.batch_sizes = HistogramData(BATCH_SIZE_BUCKETS)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Same contract as SentenceTransformer.encode for a list of strings"""
+        if len(texts) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        self._ensure_thread()
+        request = _EncodeRequest(list(texts))
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "texts": self.texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "last_batch_size": self.last_batch_size,
+        }
+
+    def _ensure_thread(self):
+        # Threads do not survive fork, so a forked worker starts its own
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # Requests queued in the parent belong to the parent
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="encode-batcher", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            n_texts = len(first.texts)
+            deadline = time.monotonic() + self.max_wait
+            while n_texts < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                n_texts += len(request.texts)
+            self._flush(batch)
+
+    def _flush(self, batch: List[_EncodeRequest]):
+        # Dedupe across callers: concurrent statements share common merchants
+        positions: Dict[str, int] = {}
+        for request in batch:
+            for text in request.texts:
+                positions.setdefault(text, len(positions))
+
+        try:
+            vectors = np.asarray(self.encode_fn(list(positions)), dtype=np.float32)
+            for request in batch:
+                request.result = vectors[[positions[t] for t in request.texts]]
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        finally:
+            self.batches += 1
+            self.requests += len(batch)
+            self.texts += len(positions)
+            self.last_batch_size = len(positions)
+            self.batch_sizes.observe(len(positions))
+            for request in batch:
+                request.done.set()
@@ -0,0 +1,234 @@
+"""
+Worker engine that keeps CPU-bound analysis off the event loop.
+
+Analyses run in a process pool whose workers each load the models once at
+start-up, or on a thread pool sharing one model when ANALYSIS_WORKERS is 0
+(where concurrent analyses also share encode batches). A pending-work limit
+provides backpressure: once it is reached new submissions fail fast with
+EngineBusy instead of queueing without bound.
+"""
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import config
+import metrics
+import pipeline
+
+
+class EngineBusy(Exception):
+    """Raised when the pending-analysis limit is reached"""
+
+
+def _init_worker(shared: bool):
+    # One detector per worker (pattern model loaded here); the text model loads on warm-up or first use
+    detector = pipeline.get_detector()
+    if not shared:
+        # Only one analysis at a time uses this model: an encode would wait for a batch nobody joins
+        detector.set_encode_batch_wait(0)
+
+
+def _warm_worker() -> Dict:
+    return pipeline.get_detector().warm_up()
+
+
+def _run_task(fn: Callable, *args):
+    """Run `fn` in a worker; returns its result, stage timings and that worker's cumulative counters"""
+    with metrics.collect() as run:
+        result = fn(*args)
+    detector = pipeline.get_detector()
+    worker_stats = {
+        "cache": detector.cache_stats(),
+        "encode_batch_sizes": detector.encode_batch_sizes(),
+    }
+    return result, os.getpid(), worker_stats, run.to_dict()
+
+
+class ProgressReporter:
+    """
+    Picklable callback that forwards (token, event) pairs from a worker to the
+    engine: stage names for progress, or any picklable record (streamed results)
+    """
+
+    def __init__(self, progress_queue, token: str):
+        self.progress_queue = progress_queue
+        self.token = token
+
+    def __call__(self, event):
+        try:
+            self.progress_queue.put((self.token, event))
+        except Exception:
+            # Reporting is best-effort and must never fail an analysis
+            pass
+
+
+class AnalysisEngine:
+    def __init__(self, workers: int = config.ANALYSIS_WORKERS,
+                 max_pending: int = config.ANALYSIS_MAX_PENDING,
+                 start_method: str = config.ANALYSIS_START_METHOD,
+                 threads: int = config.ANALYSIS_THREADS):
+        self.workers = workers
+        self.threads = threads
+        self.max_pending = max_pending
+        self.start_method = start_method
+        self.pending = 0
+        self.worker_stats: Dict[int, Dict] = {}
+        self._executor: Optional[Executor] = None
+        self._manager = None
+        self._progress_queue = None
+        self._progress_thread: Optional[threading.Thread] = None
+        self._progress_listeners: Dict[str, Callable] = {}
+        self._warmup_futures: List[Future] = []
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+                initargs=(False,)
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, self.threads), initializer=_init_worker,
+                                                initargs=(self.threads > 1,))
+
+    def _ensure_progress_channel(self):
+        """Created on first use: the manager process is only needed once jobs report progress"""
+        if self._progress_thread is not None:
+            return
+        if self.workers > 0:
+            # Proxy queue so workers can report progress back to this process
+            self._manager = multiprocessing.get_context(self.start_method).Manager()
+            self._progress_queue = self._manager.Queue()
+        else:
+            self._progress_queue = queue.Queue()
+        self._progress_thread = threading.Thread(target=self._drain_progress, daemon=True)
+        self._progress_thread.start()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self._progress_thread is not None:
+            self._progress_queue.put(None)
+            self._progress_thread.join(timeout=5)
+            self._progress_thread = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    def warm_up(self):
+        """Load models in the background: one warm-up task per worker slot"""
+        self.start()
+        slots = self.workers if self.workers > 0 else 1
+        # Busy workers make the pool spawn the next one, so each slot gets its own task
+        self._warmup_futures = [self._executor.submit(_warm_worker) for _ in range(slots)]
+
+    def readiness(self) -> Dict:
+        """Whether warm-up has finished; analyses are accepted either way"""
+        if not self._warmup_futures:
+            return {"ready": True, "warmup": "disabled"}
+        done = [f for f in self._warmup_futures if f.done()]
+        failed = [f for f in done if f.exception() is not None]
+        if failed:
+            warmup = "failed"
+        else:
+            warmup = "done" if len(done) == len(self._warmup_futures) else "running"
+        status = {
+            "ready": warmup == "done",
+            "warmup": warmup,
+            "workers_warm": len(done) - len(failed),
+            "workers_total": len(self._warmup_futures),
+        }
+        if failed:
+            status["error"] = str(failed[0].exception())
+        elif done:
+            status["models"] = done[0].result()
+        return status
+
+    def progress_reporter(self, token: str, listener: Callable) -> ProgressReporter:
+        """Callback to pass to a task; `listener(event)` runs here (on the drain thread) whenever the task reports"""
+        self._ensure_progress_channel()
+        self._progress_listeners[token] = listener
+        return ProgressReporter(self._progress_queue, token)
+
+    def release_reporter(self, token: str):
+        self._progress_listeners.pop(token, None)
+
+    def _drain_progress(self):
+        while True:
+            event = self._progress_queue.get()
+            if event is None:
+                return
+            token, payload = event
+            listener = self._progress_listeners.get(token)
+            if listener is not None:
+                listener(payload)
+
+    def check_capacity(self):
+        """Raise EngineBusy if a new analysis would be refused (e.g. before starting a streamed response)"""
+        if self.pending >= self.max_pending:
+            raise EngineBusy(f"{self.pending} analyses already pending")
+
+    async def run(self, fn: Callable, *args, with_timings: bool = False):
+        """
+        Run `fn(*args)` on the pool without blocking the event loop.
+        With `with_timings`, returns (result, timings of this run) instead of the result.
+        """
+        self.check_capacity()
+        self.start()
+
+        # Only touched from the event loop thread, so a plain counter is safe
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result, pid, stats, run = await loop.run_in_executor(self._executor, _run_task, fn, *args)
+        finally:
+            self.pending -= 1
+        self.worker_stats[pid] = stats
+        metrics.record_run(run, rejected=isinstance(result, dict) and "error" in result)
+        if with_timings:
+            return result, dict(run, worker_pid=pid)
+        return result
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Embedding-cache counters summed over the workers that have reported"""
+        totals: Dict[str, int] = {}
+        for stats in self.worker_stats.values():
+            for key, value in stats["cache"].items():
+                if key == "disk_items":
+                    # The disk tier is shared, so every worker sees the same store
+                    totals[key] = max(totals.get(key, 0), value)
+                elif key != "hit_rate":
+                    totals[key] = totals.get(key, 0) + value
+        lookups = totals.get("memory_hits", 0) + totals.get("disk_hits", 0) + totals.get("misses", 0)
+        hits = totals.get("memory_hits", 0) + totals.get("disk_hits", 0)
+        totals["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        totals["workers_reporting"] = len(self.worker_stats)
+        return totals
+
+    def metric_lines(self) -> List[str]:
+        """Engine gauges plus worker counters (latest report per worker) for /metrics"""
+        lines = metrics.sample_lines("subdetect_pending_analyses", "gauge",
+                                     "Analyses running or queued on the engine", self.pending)
+        lines += metrics.sample_lines("subdetect_pending_limit", "gauge",
+                                      "Pending analyses before uploads get 503", self.max_pending)
+        cache = self.cache_stats()
+        for key in ("memory_hits", "disk_hits", "misses"):
+            lines += metrics.sample_lines(f"subdetect_embedding_cache_{key}_total", "counter",
+                                          f"Embedding cache {key.replace('_', ' ')}", cache.get(key, 0))
+
+        batch_sizes = metrics.HistogramData(metrics.BATCH_SIZE_BUCKETS)
+        for stats in self.worker_stats.values():
+            if stats["encode_batch_sizes"] is not None:
+                batch_sizes.merge(stats["encode_batch_sizes"])
+        lines += ["# HELP subdetect_encode_batch_size Texts per sentence-transformer batch",
+                  "# TYPE subdetect_encode_batch_size histogram"]
+        lines += batch_sizes.render("subdetect_encode_batch_size")
+        return lines
@@ -0,0 +1,111 @@
+"""
+Statement file formats besides plain CSV.
+
+The format is recognised from the first bytes of the file, not from the upload
+name. gzip files and zip archives holding one CSV are decompressed while the
+CSV is read. Parquet and Arrow IPC (file or stream) are read with pyarrow,
+which is optional and imported on first use: only the needed columns are read,
+one record batch at a time, into typed arrays.
+"""
+import gzip
+import os
+import zipfile
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Iterator, List, Tuple
+
+import pandas as pd
+
+# Upload names accepted as a single statement (the content decides how it is read);
+# keep in step with the `accept` list in frontend/src/components/FileUpload.tsx
+STATEMENT_SUFFIXES = (".csv", ".csv.gz", ".gz", ".zip", ".parquet", ".pq", ".arrow", ".arrows", ".feather", ".ipc")
+# Formats read through pyarrow
+ARROW_FORMATS = ("parquet", "arrow", "arrow_stream")
+
+
+class FormatError(ValueError):
+    """The file is in a supported format but cannot be read as a statement"""
+
+
+def is_statement_name(filename: str) -> bool:
+    return filename.lower().endswith(STATEMENT_SUFFIXES)
+
+
+def sniff_format(f: BinaryIO) -> str:
+    """'csv', 'gzip', 'zip', 'parquet', 'arrow' (IPC file) or 'arrow_stream'; leaves `f` at the start"""
+    f.seek(0)
+    head = f.read(8)
+    f.seek(0)
+    if head.startswith(b"\x1f\x8b"):
+        return "gzip"
+    if head.startswith(b"PK\x03\x04"):
+        return "zip"
+    if head.startswith(b"PAR1"):
+        return "parquet"
+    if head.startswith(b"ARROW1"):
+        return "arrow"
+    # IPC stream: a continuation marker, then the schema message
+    if head.startswith(b"\xff\xff\xff\xff"):
+        return "arrow_stream"
+    return "csv"
+
+
+@contextmanager
+def open_csv(f: BinaryIO, fmt: str) -> Iterator[BinaryIO]:
+    """The CSV bytes of a 'csv', 'gzip' or 'zip' statement, decompressed as they are read"""
+    if fmt == "gzip":
+        with gzip.GzipFile(fileobj=f, mode="rb") as stream:
+            yield stream
+    elif fmt == "zip":
+        with zipfile.ZipFile(f) as archive:
+            members = [m for m in archive.infolist()
+                       if not m.is_dir() and m.filename.lower().endswith(".csv")
+                       and not os.path.basename(m.filename).startswith("._")]
+            if len(members) != 1:
+                raise FormatError(f"Zip archive holds {len(members)} CSV files; expected exactly one "
+                                  f"(use /analyze/batch for several statements)")
+            with archive.open(members[0]) as stream:
+                yield stream
+    else:
+        yield f
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise FormatError("Parquet and Arrow statements need pyarrow installed on the server (pip install pyarrow)")
+    return pyarrow
+
+
+def arrow_reader(f: BinaryIO, fmt: str, chunk_rows: int) -> Tuple[List[str], Callable[[List[str]], Iterator[pd.DataFrame]]]:
+    """
+    Column names of a Parquet/Arrow statement, and a function that yields
+    frames of at most `chunk_rows` rows holding only the given columns.
+    """
+    pa = _pyarrow()
+    try:
+        if fmt == "parquet":
+            parquet = pa.parquet.ParquetFile(f)
+            names = parquet.schema_arrow.names
+            batches = lambda columns: parquet.iter_batches(batch_size=chunk_rows, columns=columns)
+        elif fmt == "arrow":
+            reader = pa.ipc.open_file(f)
+            names = reader.schema.names
+            batches = lambda columns: (reader.get_batch(i).select(columns)
+                                       for i in range(reader.num_record_batches))
+        else:
+            reader = pa.ipc.open_stream(f)
+            names = reader.schema.names
+            batches = lambda columns: (batch.select(columns) for batch in reader)
+    except (pa.ArrowException, OSError) as e:
+        raise FormatError(f"Could not read {fmt.replace('_', ' ')} file: {e}")
+
+    def frames(columns: List[str]) -> Iterator[pd.DataFrame]:
+        for batch in batches(columns):
+            # IPC batches can be any size; slices are zero-copy
+            for start in range(0, batch.num_rows, chunk_rows):
+                yield batch.slice(start, chunk_rows).to_pandas(date_as_object=False)
+
+    return names, frames
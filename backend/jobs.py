@@ -0,0 +1,153 @@
+"""
+Asynchronous analysis jobs: submit an upload, poll its progress, fetch the result.
+
+Jobs wait in a bounded in-memory queue and are picked up by a fixed number of
+runner tasks that hand them to the AnalysisEngine. Finished results are kept
+for JOB_RESULT_TTL seconds. Everything is local to the server process, so no
+external broker is needed.
+"""
+import asyncio
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import config
+from engine import AnalysisEngine, EngineBusy
+from pipeline import PIPELINE_STAGES, analyze_statement_file
+from uploads import remove_spooled
+
+
+class Job:
+    def __init__(self, path: str, filename: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        # Spooled upload, removed once the job finishes
+        self.path: Optional[str] = path
+        self.status = "queued"
+        self.stages = {stage: "pending" for stage in PIPELINE_STAGES}
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def mark_stage(self, stage: str):
+        """A stage started: every earlier stage is done"""
+        # Reports can trail the result through the progress channel
+        if self.finished or stage not in self.stages:
+            return
+        for name in PIPELINE_STAGES:
+            if name == stage:
+                self.stages[name] = "running"
+                break
+            self.stages[name] = "done"
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "stages": dict(self.stages),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    def __init__(self, engine: AnalysisEngine,
+                 max_queued: int = config.JOB_MAX_QUEUED,
+                 concurrency: int = config.JOB_CONCURRENCY,
+                 ttl: int = config.JOB_RESULT_TTL,
+                 max_stored: int = config.JOB_MAX_STORED):
+        self.engine = engine
+        self.max_queued = max_queued
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.max_stored = max_stored
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._runners: List[asyncio.Task] = []
+
+    def start(self):
+        if self._runners:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._runners = [asyncio.create_task(self._runner()) for _ in range(self.concurrency)]
+
+    async def shutdown(self):
+        for task in self._runners:
+            task.cancel()
+        await asyncio.gather(*self._runners, return_exceptions=True)
+        self._runners = []
+        # Jobs that never ran still own their spooled uploads
+        while self._queue is not None and not self._queue.empty():
+            remove_spooled(self._queue.get_nowait().path)
+
+    def submit(self, path: str, filename: str) -> Job:
+        """Queue a spooled upload for analysis; raises EngineBusy when the queue is full"""
+        self.start()
+        self._evict()
+        job = Job(path, filename)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise EngineBusy(f"{self.max_queued} jobs already queued")
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._evict()
+        return self.jobs.get(job_id)
+
+    def _evict(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > self.ttl]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+        # Over the cap: drop the oldest finished jobs (insertion order)
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_stored)]:
+            del self.jobs[job_id]
+
+    async def _runner(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        job.started_at = time.time()
+        reporter = self.engine.progress_reporter(job.id, job.mark_stage)
+        try:
+            while True:
+                try:
+                    job.result = await self.engine.run(analyze_statement_file, job.path, reporter)
+                    break
+                except EngineBusy:
+                    # Synchronous /analyze calls hold the pool; wait for a slot
+                    await asyncio.sleep(1.0)
+            job.status = "done"
+            for stage in job.stages:
+                job.stages[stage] = "done"
+        except Exception as e:
+            traceback.print_exc()
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            self.engine.release_reporter(job.id)
+            remove_spooled(job.path)
+            job.path = None
+            job.finished_at = time.time()
@@ -0,0 +1,60 @@
+import re
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+
+def keyword_pattern(keywords: Iterable[str]) -> "re.Pattern":
+    """
+    Compile keywords into one trie-shaped alternation regex.
+    Shared prefixes are factored out, so a search costs roughly one step per
+    character of the input instead of one substring scan per keyword.
+    """
+    trie: Dict = {}
+    for keyword in keywords:
+        if not keyword:
+            continue
+        node = trie
+        for ch in keyword:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node: Dict) -> str:
+        # Only containment matters, so a keyword ending here makes longer ones redundant
+        if '' in node:
+            return ''
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items())]
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')'
+
+    return re.compile(build(trie) if trie else '(?!)')
+
+
+class KeywordMatcher:
+    """
+    Named keyword tables compiled once into one regex per table.
+    Matching is substring containment, same as `any(k in text for k in keywords)`.
+    """
+
+    def __init__(self, tables: Dict[str, Iterable[str]]):
+        self.patterns = {name: keyword_pattern(keywords) for name, keywords in tables.items()}
+
+    def matches(self, text: str) -> List[str]:
+        """Names of every table with a keyword in `text`, in table order"""
+        return [name for name, pattern in self.patterns.items() if pattern.search(text)]
+
+    def first(self, text: str) -> Optional[str]:
+        """Name of the first table (in table order) with a keyword in `text`"""
+        for name, pattern in self.patterns.items():
+            if pattern.search(text):
+                return name
+        return None
+
+    def match_frame(self, texts: pd.Series) -> pd.DataFrame:
+        """Vectorized `matches`: one boolean column per table, aligned with `texts`"""
+        texts = texts.fillna('').astype(str)
+        return pd.DataFrame(
+            {name: texts.str.contains(pattern, regex=True) for name, pattern in self.patterns.items()},
+            index=texts.index
+        )
@@ -0,0 +1,141 @@
+"""
+Registry of known bank export layouts.
+
+A layout is keyed by a fingerprint of its column header line and remembers
+which columns hold the date, description and amount plus an explicit date
+format. Statements whose header matches a known layout skip column detection
+and parse dates with that fixed format instead of per-request inference.
+Unknown layouts are learned after their first successful parse and persisted
+to a small JSON file shared by all workers.
+"""
+import hashlib
+import json
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# Non-null date values checked before a guessed format is trusted
+DATE_FORMAT_SAMPLE = 1000
+
+
+def header_fingerprint(header_line: bytes) -> str:
+    """Stable key for a header line; only surrounding whitespace (and line endings) is ignored"""
+    return hashlib.sha1(header_line.strip()).hexdigest()[:16]
+
+
+def guess_date_format(values: pd.Series) -> Optional[str]:
+    """
+    Explicit strptime format for a column of date strings, or None.
+    Guessed from the first value the way pandas infers it, then only kept if it
+    parses a sample exactly like `pd.to_datetime(..., dayfirst=True)` does.
+    """
+    sample = values.dropna()[:DATE_FORMAT_SAMPLE]
+    if sample.empty:
+        return None
+    date_format = guess_datetime_format(str(sample.iloc[0]), dayfirst=True)
+    if date_format is None:
+        return None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        inferred = pd.to_datetime(sample, errors='coerce', dayfirst=True)
+    explicit = pd.to_datetime(sample, errors='coerce', format=date_format)
+    return date_format if explicit.equals(inferred) else None
+
+
+def parse_dates(values: pd.Series, date_format: Optional[str]) -> pd.Series:
+    """`pd.to_datetime(values, dayfirst=True)` with a known format as the fast path"""
+    if date_format is None:
+        return pd.to_datetime(values, errors='coerce', dayfirst=True)
+    parsed = pd.to_datetime(values, errors='coerce', format=date_format)
+    # Values the layout's format does not fit fall back to inference
+    missed = parsed.isna() & values.notna()
+    if missed.any():
+        parsed[missed] = pd.to_datetime(values[missed], errors='coerce', dayfirst=True)
+    return parsed
+
+
+class BankLayout:
+    def __init__(self, fingerprint: str, columns: Dict[str, str], positions: Dict[str, int],
+                 date_format: Optional[str] = None):
+        self.fingerprint = fingerprint
+        # role ('date', 'description', 'amount') -> column name as pandas reads it
+        self.columns = columns
+        # role -> column position in the header
+        self.positions = positions
+        self.date_format = date_format
+
+    def to_dict(self) -> Dict:
+        return {
+            "columns": self.columns,
+            "positions": self.positions,
+            "date_format": self.date_format,
+        }
+
+    @classmethod
+    def from_dict(cls, fingerprint: str, data: Dict) -> "BankLayout":
+        return cls(fingerprint, data["columns"], data["positions"], data.get("date_format"))
+
+
+class LayoutRegistry:
+    """
+    In-process layout table, backed by a JSON file when `path` is set.
+    The file is read on first use and rewritten atomically whenever a layout
+    is learned, merging in layouts other workers learned meanwhile.
+    """
+
+    def __init__(self, path: Optional[str], max_layouts: int = 500):
+        self.path = path
+        self.max_layouts = max_layouts
+        self._layouts: "OrderedDict[str, BankLayout]" = OrderedDict()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def get(self, fingerprint: str) -> Optional[BankLayout]:
+        with self._lock:
+            self._ensure_loaded()
+            return self._layouts.get(fingerprint)
+
+    def learn(self, layout: BankLayout):
+        with self._lock:
+            self._ensure_loaded()
+            if self.path:
+                # Another worker may have learned layouts since we loaded
+                self._layouts.update(self._read_file())
+            self._layouts[layout.fingerprint] = layout
+            while len(self._layouts) > self.max_layouts:
+                self._layouts.popitem(last=False)
+            self._write_file()
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._loaded = True
+            if self.path:
+                self._layouts.update(self._read_file())
+
+    def _read_file(self) -> Dict[str, BankLayout]:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            return {fp: BankLayout.from_dict(fp, entry) for fp, entry in data.items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Warning: Ignoring unreadable layout registry {self.path}: {e}")
+            return {}
+
+    def _write_file(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp_path, "w", encoding='utf-8') as f:
+                json.dump({fp: layout.to_dict() for fp, layout in self._layouts.items()}, f, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Warning: Could not save layout registry: {e}")
@@ -0,0 +1,206 @@
+"""
+Lightweight instrumentation: per-analysis stage timers and Prometheus text metrics.
+
+Pipeline code calls `start_stage(name)` and `count(name, n)`; they record into
+the AnalysisRun collected around the current analysis (thread-local, so it
+works on worker threads and in worker processes) and do nothing otherwise.
+The finished run is a plain dict, shipped back to the server process with the
+result and folded into the module-level metrics rendered at /metrics.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ROWS_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+# ============= PER-ANALYSIS COLLECTION =============
+class AnalysisRun:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: "OrderedDict[str, float]" = OrderedDict()
+        self.counts: Dict[str, int] = {}
+        self.error: Optional[str] = None
+        self._stage: Optional[str] = None
+        self._stage_started = 0.0
+
+    def start_stage(self, stage: Optional[str]):
+        """Stage `stage` begins now (None: no stage); the previous one, if any, ends"""
+        now = time.perf_counter()
+        if self._stage is not None:
+            self.stages[self._stage] = self.stages.get(self._stage, 0.0) + now - self._stage_started
+        self._stage, self._stage_started = stage, now
+
+    def finish(self):
+        self.start_stage(None)
+        self.total = time.perf_counter() - self.started
+
+    def to_dict(self) -> Dict:
+        return {
+            "total_seconds": round(self.total, 4),
+            "stages": {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+            "counts": dict(self.counts),
+            "error": self.error,
+        }
+
+
+_local = threading.local()
+
+
+@contextmanager
+def collect() -> Iterator[AnalysisRun]:
+    """Collect stage timings and counts for the analysis run inside the block"""
+    run = AnalysisRun()
+    _local.run = run
+    try:
+        yield run
+    finally:
+        _local.run = None
+        run.finish()
+
+
+def start_stage(stage: str):
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run.start_stage(stage)
+
+
+def count(name: str, value: int):
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run.counts[name] = run.counts.get(name, 0) + int(value)
+
+
+def record_error(error: BaseException):
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run.error = type(error).__name__
+
+
+# ============= PROMETHEUS METRICS =============
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class HistogramData:
+    """Bucket counts of one histogram series; picklable, so workers can ship it as-is"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "HistogramData"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def render(self, name: str, label_names: Sequence[str] = (), label_values: Sequence[str] = ()) -> List[str]:
+        lines = []
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            le = f'le="{bound:g}"'
+            lines.append(f"{name}_bucket{_labels(label_names, label_values, le)} {bucket_count}")
+        le = 'le="+Inf"'
+        lines.append(f"{name}_bucket{_labels(label_names, label_values, le)} {self.count}")
+        lines.append(f"{name}_sum{_labels(label_names, label_values)} {self.sum:g}")
+        lines.append(f"{name}_count{_labels(label_names, label_values)} {self.count}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = tuple(label_names)
+        self._series: Dict[Tuple[str, ...], HistogramData] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            data = self._series.get(label_values)
+            if data is None:
+                data = self._series[label_values] = HistogramData(self.buckets)
+            data.observe(value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, data in sorted(self._series.items()):
+                lines.extend(data.render(self.name, self.label_names, label_values))
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values: str):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, label_values)} {value:g}")
+        return lines
+
+
+def sample_lines(name: str, metric_type: str, help_text: str, value: float) -> List[str]:
+    """One unlabeled counter or gauge whose value is read at scrape time"""
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {value:g}"]
+
+
+ANALYSES = Counter("subdetect_analyses_total", "Analyses finished, by outcome", ["outcome"])
+ANALYSIS_ERRORS = Counter("subdetect_analysis_errors_total", "Analyses that raised, by exception type", ["type"])
+ANALYSIS_SECONDS = Histogram("subdetect_analysis_seconds", "Wall time of one analysis", SECONDS_BUCKETS)
+STAGE_SECONDS = Histogram("subdetect_stage_seconds", "Wall time of one pipeline stage", SECONDS_BUCKETS, ["stage"])
+STATEMENT_ROWS = Histogram("subdetect_statement_rows", "Valid transactions per statement", ROWS_BUCKETS)
+ITEMS = Counter("subdetect_items_total", "Rows, merchants and groups processed", ["kind"])
+
+REGISTRY = [ANALYSES, ANALYSIS_ERRORS, ANALYSIS_SECONDS, STAGE_SECONDS, STATEMENT_ROWS, ITEMS]
+
+
+def record_run(run: Dict, rejected: bool = False):
+    """Fold a finished AnalysisRun dict into the module metrics; `rejected`: the statement was unusable"""
+    if run["error"]:
+        ANALYSES.inc(1, "error")
+        ANALYSIS_ERRORS.inc(1, run["error"])
+    else:
+        ANALYSES.inc(1, "rejected" if rejected else "success")
+    ANALYSIS_SECONDS.observe(run["total_seconds"])
+    for stage, seconds in run["stages"].items():
+        STAGE_SECONDS.observe(seconds, stage)
+    for kind, value in run["counts"].items():
+        ITEMS.inc(value, kind)
+    if "rows" in run["counts"]:
+        STATEMENT_ROWS.observe(run["counts"]["rows"])
+
+
+def render(extra_lines: List[str] = ()) -> str:
+    """Prometheus text exposition of the module metrics plus `extra_lines`"""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
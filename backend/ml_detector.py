@@ -1,78 +1,241 @@
 from sklearn.ensemble import IsolationForest
-from sentence_transformers import SentenceTransformer
-from sklearn.cluster import DBSCAN
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import normalize
+from scipy.sparse.csgraph import connected_components
 import numpy as np
 from typing import List, Dict
+import threading
 import warnings
+import config
+from embedding_cache import EmbeddingCache
+from encode_batcher import EncodeBatcher
+from model_store import load_pattern_model
 warnings.filterwarnings('ignore')
 
+def build_pattern_detector() -> IsolationForest:
+    """Unfitted Isolation Forest with the project's standard settings"""
+    return IsolationForest(
+        contamination=0.15,
+        random_state=42,
+        n_estimators=100
+    )
+
+# Cosine distance under which two merchant names are the same merchant
+CLUSTER_EPS = 0.3
+
+def char_ngram_embeddings(descriptions: List[str]):
+    """Sparse character n-gram TF-IDF vectors: the torch-free 'lite' text backend"""
+    vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 4), lowercase=True, dtype=np.float32)
+    return vectorizer.fit_transform(descriptions)
+
+def cluster_labels(embeddings: np.ndarray, eps: float = CLUSTER_EPS) -> np.ndarray:
+    """
+    DBSCAN(eps, min_samples=2, metric='cosine') labels without the brute-force
+    distance matrix. With min_samples=2 every point that has a neighbour is a
+    core point, so clusters are the connected components of the eps-radius
+    graph and points with no neighbour are noise (-1).
+    Accepts dense embeddings or sparse TF-IDF rows.
+    """
+    n = embeddings.shape[0]
+    if n < 2:
+        return np.full(n, -1, dtype=int)
+    
+    # On unit vectors: cosine_distance = ||a - b||^2 / 2
+    unit = normalize(embeddings)
+    radius = float(np.sqrt(2.0 * eps))
+    graph = NearestNeighbors(radius=radius).fit(unit).radius_neighbors_graph(unit, mode='connectivity')
+    _, components = connected_components(graph, directed=False)
+    
+    sizes = np.bincount(components)
+    return np.where(sizes[components] > 1, components, -1)
+
+def blocking_key(description: str) -> str:
+    """Names are only compared within a block: same leading characters of the first word"""
+    words = description.split()
+    return words[0][:4] if words else ""
+
+def blocked_cluster_labels(embeddings: np.ndarray, descriptions: List[str], eps: float = CLUSTER_EPS) -> np.ndarray:
+    """cluster_labels computed separately inside each blocking_key block"""
+    blocks: Dict[str, List[int]] = {}
+    for idx, desc in enumerate(descriptions):
+        blocks.setdefault(blocking_key(desc), []).append(idx)
+    
+    labels = np.full(len(descriptions), -1, dtype=int)
+    next_label = 0
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        members = np.asarray(members)
+        block_labels = cluster_labels(embeddings[members], eps)
+        clustered = block_labels >= 0
+        labels[members[clustered]] = block_labels[clustered] + next_label
+        next_label += int(block_labels.max()) + 1 if clustered.any() else 0
+    return labels
+
+def representative_mapping(descriptions: List[str], labels: np.ndarray) -> Dict[str, str]:
+    """Map each name to its cluster's shortest member (first one on ties) in a single pass"""
+    representative: Dict[int, str] = {}
+    for desc, label in zip(descriptions, labels):
+        if label == -1:
+            continue
+        current = representative.get(label)
+        if current is None or len(desc) < len(current):
+            representative[label] = desc
+    return {
+        desc: desc if label == -1 else representative[label]
+        for desc, label in zip(descriptions, labels)
+    }
+
 class SubscriptionDetector:
-    def __init__(self):
-        # Pre-trained model for merchant name understanding
+    def __init__(self, text_backend: str = config.TEXT_BACKEND):
+        # Merchant name understanding: "transformer" (sentence embeddings, loaded
+        # lazily on first use or warm_up) or "lite" (char n-gram TF-IDF, no torch)
+        self.text_backend = text_backend
+        self._text_model = None
+        self._text_model_loaded = text_backend != "transformer"
+        self._load_lock = threading.Lock()
+        
+        # Concurrent analyses share one model batch instead of encoding separately
+        self.encoder = None
+        self.encode_batch_wait_ms = config.ENCODE_BATCH_MAX_WAIT_MS
+        
+        # Merchant strings repeat across statements, so only encode unseen ones
+        self.embedding_cache = EmbeddingCache(
+            cache_dir=config.EMBEDDING_CACHE_DIR,
+            model_name=config.TEXT_MODEL_NAME,
+            max_items=config.EMBEDDING_CACHE_SIZE
+        )
+        
+        # Unsupervised anomaly detector for subscription patterns.
+        # Prefer the offline-trained artifact so requests never fit anything.
+        self.pattern_detector = build_pattern_detector()
+        self.pattern_model_version = None
+        try:
+            artifact = load_pattern_model()
+            if artifact is not None:
+                self.pattern_detector = artifact["model"]
+                self.pattern_model_version = artifact["version"]
+                print(f"Loaded pattern model v{self.pattern_model_version}")
+            else:
+                print("Warning: No trained pattern model found, fitting per request "
+                      "(run train_model.py)")
+        except Exception as e:
+            print(f"Warning: Failed to load pattern model: {e}")
+        
+    @property
+    def text_model(self):
+        """Sentence transformer, imported and loaded on first access"""
+        if not self._text_model_loaded:
+            with self._load_lock:
+                if not self._text_model_loaded:
+                    self._load_text_model()
+        return self._text_model
+    
+    def _load_text_model(self):
         print("Loading Sentence Transformer model...")
         try:
-            self.text_model = SentenceTransformer('all-MiniLM-L6-v2')
+            # Deferred so importing this module never pulls in torch
+            from sentence_transformers import SentenceTransformer
+            self._text_model = SentenceTransformer(config.TEXT_MODEL_NAME)
+            self.encoder = EncodeBatcher(
+                self._text_model.encode,
+                max_batch_size=config.ENCODE_BATCH_MAX_SIZE,
+                max_wait_ms=self.encode_batch_wait_ms
+            )
         except Exception as e:
             print(f"Warning: Failed to load transformer model: {e}")
-            self.text_model = None
-        
-        # Unsupervised anomaly detector for subscription patterns
-        self.pattern_detector = IsolationForest(
-            contamination=0.15,
-            random_state=42,
-            n_estimators=100
-        )
-        
+            self._text_model = None
+        self._text_model_loaded = True
+    
+    def warm_up(self) -> Dict:
+        """Load everything a request needs so the first analysis pays no start-up cost"""
+        if self.text_backend == "transformer":
+            self.text_model
+        return {
+            "text_backend": self.text_backend,
+            "text_model_loaded": self._text_model is not None,
+            "pattern_model": self.pattern_model_version,
+        }
+    
+    def set_encode_batch_wait(self, max_wait_ms: float):
+        """How long encode calls wait for others to join their batch; 0 when nothing else shares this model"""
+        self.encode_batch_wait_ms = max_wait_ms
+        if self.encoder is not None:
+            self.encoder.max_wait = max_wait_ms / 1000.0
+    
     def cluster_merchants(self, descriptions: List[str]) -> Dict[str, str]:
         """
-        Group similar merchant names using semantic embeddings
+        Group similar merchant names using semantic (or char n-gram) embeddings
         Returns: dict mapping original description -> unified name
         """
         if len(descriptions) < 2:
             return {desc: desc for desc in descriptions}
         
-        if self.text_model is None:
+        if self.text_backend != "lite" and self.text_model is None:
             return {desc: desc for desc in descriptions}
         
         try:
-            embeddings = self.text_model.encode(descriptions)
-            clustering = DBSCAN(eps=0.3, min_samples=2, metric='cosine')
-            labels = clustering.fit_predict(embeddings)
-            
-            mapping = {}
-            for idx, desc in enumerate(descriptions):
-                cluster_id = labels[idx]
-                if cluster_id == -1:
-                    mapping[desc] = desc
-                else:
-                    cluster_members = [descriptions[i] for i, l in enumerate(labels) if l == cluster_id]
-                    representative = min(cluster_members, key=len)
-                    mapping[desc] = representative
-            
-            return mapping
+            if self.text_backend == "lite":
+                embeddings, eps = char_ngram_embeddings(descriptions), config.LITE_CLUSTER_EPS
+            else:
+                embeddings, eps = self.embedding_cache.encode(descriptions, self.encoder.encode), CLUSTER_EPS
+            if len(descriptions) >= config.CLUSTER_BLOCKING_THRESHOLD:
+                labels = blocked_cluster_labels(embeddings, descriptions, eps)
+            else:
+                labels = cluster_labels(embeddings, eps)
+            return representative_mapping(descriptions, labels)
         except Exception as e:
             print(f"Error in clustering: {e}")
             return {desc: desc for desc in descriptions}
     
-    def detect_subscription_pattern(self, features_array):
+    def cache_stats(self) -> Dict[str, int]:
+        """Embedding cache hit/miss counters"""
+        return self.embedding_cache.stats()
+    
+    def encoder_stats(self) -> Dict[str, float]:
+        """Encode micro-batching counters"""
+        return self.encoder.stats() if self.encoder is not None else {}
+    
+    def encode_batch_sizes(self):
+        """Histogram of texts per model batch, or None before the text model is used"""
+        return self.encoder.batch_sizes if self.encoder is not None else None
+    
+    def detect_subscription_patterns(self, features_matrix):
         """
-        Use Isolation Forest to detect if transaction pattern is subscription-like
-        Returns: (prediction, score)
+        Score every merchant group in one vectorized call.
+        Uses the pre-trained model when loaded, otherwise fits the forest
+        once on the whole (n_groups x n_features) matrix.
+        The scores only feed the confidence: either forest's contamination
+        cut-off comes from unlabelled data, so its outlier verdict would drop
+        real subscriptions. Every prediction is 1 (accepted) and the
+        rule-based confidence check decides.
+        Returns: (predictions, scores) arrays aligned with the matrix rows
         """
-        if features_array is None or len(features_array) == 0:
-            return -1, -1.0
+        if features_matrix is None or len(features_matrix) == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=float)
         
+        features_matrix = np.atleast_2d(np.asarray(features_matrix, dtype=float))
         try:
-            prediction = self.pattern_detector.fit_predict(features_array)
-            score = self.pattern_detector.score_samples(features_array)
-            return int(prediction[0]), float(score[0])
+            if self.pattern_model_version is not None:
+                scores = self.pattern_detector.score_samples(features_matrix)
+                return np.ones(len(features_matrix), dtype=int), scores.astype(float)
+            
+            # Fresh forest per call: analyses may run concurrently on threads.
+            # Its contamination quantile would flag the most unusual groups of
+            # every statement (the priciest plans), so it never rejects either
+            detector = build_pattern_detector().fit(features_matrix)
+            scores = detector.score_samples(features_matrix)
+            return np.ones(len(features_matrix), dtype=int), scores.astype(float)
         except Exception as e:
             print(f"Error in pattern detection: {e}")
-            return -1, -1.0
+            n = len(features_matrix)
+            return np.full(n, -1, dtype=int), np.full(n, -1.0)
     
-    def calculate_confidence(self, features_dict, ml_score):
+    def calculate_confidence(self, features_dict, ml_score, regularity=None):
         """
-        Calculate confidence score based on ML prediction + feature analysis
+        Calculate confidence score based on ML prediction + feature analysis.
+        `regularity` is the periodicity score of the group's dominant period, if any.
         Returns: (confidence_score, confidence_label)
         """
         if features_dict is None:
@@ -88,11 +251,22 @@ class SubscriptionDetector:
             # Factor 2: Interval consistency (VERY GENEROUS)
             interval_cv = features_dict.get('interval_cv', 1.0)
             if interval_cv < 0.2:
-                confidence_score += 0.25
+                interval_points = 0.25
             elif interval_cv < 0.3:
-                confidence_score += 0.15
+                interval_points = 0.15
             elif interval_cv < 0.5:
-                confidence_score += 0.10
+                interval_points = 0.10
+            else:
+                interval_points = 0.0
+            # A skipped month inflates the CV; the periodicity score allows for it
+            if regularity is not None:
+                if regularity >= 0.9:
+                    interval_points = max(interval_points, 0.25)
+                elif regularity >= 0.75:
+                    interval_points = max(interval_points, 0.15)
+                elif regularity >= 0.6:
+                    interval_points = max(interval_points, 0.10)
+            confidence_score += interval_points
             
             # Factor 3: Amount consistency (MORE GENEROUS)
             amount_consistency = features_dict.get('amount_consistency', 0.0)
@@ -1,77 +1,115 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime
+from typing import Dict, Tuple
 
-def extract_ml_features(group_df):
+from columnar import day_of_month
+
+# Column order of the feature matrix fed to the pattern model
+FEATURE_ORDER = [
+    'transaction_count', 'avg_interval_days', 'interval_std', 'interval_cv',
+    'avg_amount', 'amount_std', 'amount_consistency', 'total_spent',
+    'max_amount', 'min_amount', 'day_of_month_std', 'days_since_last',
+    'is_monthly_pattern', 'is_yearly_pattern', 'is_weekly_pattern'
+]
+
+
+def extract_ml_features_grouped(days: np.ndarray, amounts: np.ndarray, offsets: np.ndarray,
+                                now=None) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Extract ML features from a transaction group for subscription detection
+    The 15 pattern features for every merchant group, with groups stored as
+    contiguous runs of sorted arrays: group i is rows offsets[i]:offsets[i + 1]
+    of `days` (epoch days, date-sorted within each group) and `amounts`. Uses
+    whole-array reductions at the group offsets, so no per-group frames are
+    built. Groups with fewer than two rows are dropped.
+    Returns: (n_groups x 15 float array in FEATURE_ORDER, indices of the kept groups)
     """
-    if len(group_df) < 2:
-        return None
+    if now is None:
+        now = pd.Timestamp.now()
+    now_day = int(np.datetime64(now, 'D').astype(np.int64))
     
-    # Sort by date
-    group_df = group_df.sort_values('date').copy()
+    sizes = np.diff(offsets)
+    nonempty = np.flatnonzero(sizes > 0)
+    if not len(nonempty):
+        return np.zeros((0, len(FEATURE_ORDER))), nonempty
+    starts = offsets[:-1][nonempty]
+    counts = sizes[nonempty]
+    group = np.repeat(np.arange(len(counts)), counts)
     
-    # Time-based features
-    date_diffs = group_df['date'].diff().dt.days.dropna()
+    days = np.asarray(days, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=float)
+    first_day = days[starts]
+    last_day = days[starts + counts - 1]
+    n_intervals = counts - 1
     
-    if len(date_diffs) == 0:
-        return None
+    def group_std(values, means, ddof_count):
+        """Sample standard deviation per group, given per-group means"""
+        squares = np.add.reduceat((values - means[group]) ** 2, starts)
+        return np.sqrt(squares / ddof_count)
     
-    features = {
-        # Frequency Features
-        'transaction_count': len(group_df),
-        'avg_interval_days': float(date_diffs.mean()),
-        'interval_std': float(date_diffs.std()) if len(date_diffs) > 1 else 0.0,
-        'interval_cv': float(date_diffs.std() / date_diffs.mean()) if len(date_diffs) > 0 and date_diffs.mean() > 0 else 0.0,
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Intervals sum to last - first, so the mean needs no per-row pass; each
+        # group's first row has no interval and is given the mean (zero deviation)
+        avg_interval = (last_day - first_day) / n_intervals
+        intervals = np.diff(days, prepend=days[0]).astype(float)
+        intervals[starts] = avg_interval
+        interval_std = group_std(intervals, avg_interval, n_intervals - 1)
         
-        # Amount Features
-        'avg_amount': float(group_df['amount'].mean()),
-        'amount_std': float(group_df['amount'].std()),
-        'amount_consistency': float(1 - (group_df['amount'].std() / group_df['amount'].mean())) if group_df['amount'].mean() > 0 else 0.0,
-        'total_spent': float(group_df['amount'].sum()),
-        'max_amount': float(group_df['amount'].max()),
-        'min_amount': float(group_df['amount'].min()),
+        total_spent = np.add.reduceat(amounts, starts)
+        avg_amount = total_spent / counts
+        amount_std = group_std(amounts, avg_amount, counts - 1)
         
-        # Date Pattern Features
-        'day_of_month_std': float(group_df['date'].dt.day.std()),
-        'days_since_last': int((pd.Timestamp.now() - group_df['date'].iloc[-1]).days),
+        day = day_of_month(days).astype(float)
+        day_of_month_std = group_std(day, np.add.reduceat(day, starts) / counts, counts - 1)
         
-        # Regularity Score (custom metric)
-        'is_monthly_pattern': 1 if 25 <= date_diffs.mean() <= 35 else 0,
-        'is_yearly_pattern': 1 if 360 <= date_diffs.mean() <= 375 else 0,
-        'is_weekly_pattern': 1 if 6 <= date_diffs.mean() <= 8 else 0,
-    }
+        interval_cv = np.where(avg_interval > 0, interval_std / avg_interval, 0.0)
+        amount_consistency = np.where(avg_amount > 0, 1 - amount_std / avg_amount, 0.0)
+    interval_cv[~np.isfinite(interval_cv)] = 0.0
+    amount_consistency[~np.isfinite(amount_consistency)] = 0.0
     
-    # Handle edge cases
-    if np.isnan(features['interval_cv']) or np.isinf(features['interval_cv']):
-        features['interval_cv'] = 0.0
-    
-    if np.isnan(features['amount_consistency']) or np.isinf(features['amount_consistency']):
-        features['amount_consistency'] = 0.0
+    columns = {
+        'transaction_count': counts.astype(float),
+        'avg_interval_days': avg_interval,
+        'interval_std': np.where(n_intervals > 1, interval_std, 0.0),
+        'interval_cv': interval_cv,
+        'avg_amount': avg_amount,
+        'amount_std': amount_std,
+        'amount_consistency': amount_consistency,
+        'total_spent': total_spent,
+        'max_amount': np.maximum.reduceat(amounts, starts),
+        'min_amount': np.minimum.reduceat(amounts, starts),
+        'day_of_month_std': day_of_month_std,
+        'days_since_last': (now_day - last_day).astype(float),
+        'is_monthly_pattern': ((avg_interval >= 25) & (avg_interval <= 35)).astype(float),
+        'is_yearly_pattern': ((avg_interval >= 360) & (avg_interval <= 375)).astype(float),
+        'is_weekly_pattern': ((avg_interval >= 6) & (avg_interval <= 8)).astype(float),
+    }
     
-    return features
+    kept = n_intervals > 0
+    matrix = np.column_stack([columns[k][kept] for k in FEATURE_ORDER])
+    matrix = np.nan_to_num(matrix, nan=0.0, posinf=1.0, neginf=0.0)
+    return matrix, nonempty[kept]
 
 
-def features_to_array(features_dict):
-    """Convert feature dict to numpy array for ML model"""
-    if features_dict is None:
-        return None
-    
-    feature_order = [
-        'transaction_count', 'avg_interval_days', 'interval_std', 'interval_cv',
-        'avg_amount', 'amount_std', 'amount_consistency', 'total_spent',
-        'max_amount', 'min_amount', 'day_of_month_std', 'days_since_last',
-        'is_monthly_pattern', 'is_yearly_pattern', 'is_weekly_pattern'
-    ]
-    
-    try:
-        array = np.array([features_dict[k] for k in feature_order], dtype=float).reshape(1, -1)
-        
-        # Replace any NaN or Inf values
-        array = np.nan_to_num(array, nan=0.0, posinf=1.0, neginf=0.0)
-        
-        return array
-    except Exception as e:
-        print(f"Error converting features to array: {e}")
-        return None
+# Pattern flags set from a detected frequency label
+PATTERN_FLAGS = {'Monthly': 'is_monthly_pattern', 'Yearly': 'is_yearly_pattern', 'Weekly': 'is_weekly_pattern'}
+
+def set_pattern_flags(matrix: np.ndarray, frequencies) -> None:
+    """
+    Overwrite the is_*_pattern flags in place from each row's detected
+    frequency (periodicity.detect_periods). Rows whose frequency is None keep
+    the flags derived from their mean interval.
+    """
+    columns = {flag: FEATURE_ORDER.index(flag) for flag in PATTERN_FLAGS.values()}
+    for row, frequency in zip(matrix, frequencies):
+        if frequency is None:
+            continue
+        for label, flag in PATTERN_FLAGS.items():
+            row[columns[flag]] = float(frequency == label)
+
+
+INTEGER_FEATURES = {'transaction_count', 'days_since_last', 'is_monthly_pattern',
+                    'is_yearly_pattern', 'is_weekly_pattern'}
+
+def array_to_features(row) -> Dict:
+    """Convert one feature-matrix row back to the dict form used by calculate_confidence"""
+    return {k: int(v) if k in INTEGER_FEATURES else float(v) for k, v in zip(FEATURE_ORDER, row)}
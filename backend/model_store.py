@@ -0,0 +1,73 @@
+"""
+Versioned pattern-model artifacts on disk (models/pattern_model_vN.joblib).
+Listing and resolving versions is cheap; joblib/scikit-learn are only
+imported when an artifact is actually saved or loaded.
+"""
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import config
+from ml_features import FEATURE_ORDER
+
+PATTERN_MODEL_PATTERN = re.compile(r'^pattern_model_v(\d+)\.joblib$')
+
+def list_pattern_models(model_dir: str = config.PATTERN_MODEL_DIR) -> Dict[int, str]:
+    """Map of version -> artifact path for every pattern model on disk"""
+    if not os.path.isdir(model_dir):
+        return {}
+    models = {}
+    for name in os.listdir(model_dir):
+        match = PATTERN_MODEL_PATTERN.match(name)
+        if match:
+            models[int(match.group(1))] = os.path.join(model_dir, name)
+    return models
+
+def save_pattern_model(model, n_samples: int, sources: List[str],
+                       model_dir: str = config.PATTERN_MODEL_DIR) -> str:
+    """Write a fitted model as the next versioned artifact; returns its path"""
+    import joblib
+    import sklearn
+    
+    os.makedirs(model_dir, exist_ok=True)
+    version = max(list_pattern_models(model_dir), default=0) + 1
+    path = os.path.join(model_dir, f"pattern_model_v{version}.joblib")
+    joblib.dump({
+        "model": model,
+        "version": version,
+        "feature_order": FEATURE_ORDER,
+        "sklearn_version": sklearn.__version__,
+        "trained_at": datetime.now().isoformat(timespec='seconds'),
+        "n_samples": n_samples,
+        "sources": sources,
+    }, path)
+    return path
+
+def resolve_pattern_model_version(version: str = config.PATTERN_MODEL_VERSION,
+                                  model_dir: str = config.PATTERN_MODEL_DIR) -> Optional[int]:
+    """Version that load_pattern_model would pick (pinned or newest), without loading it"""
+    models = list_pattern_models(model_dir)
+    if version:
+        return int(version) if int(version) in models else None
+    return max(models, default=None)
+
+def load_pattern_model(version: str = config.PATTERN_MODEL_VERSION,
+                       model_dir: str = config.PATTERN_MODEL_DIR) -> Optional[Dict]:
+    """Load a pinned (or the newest) pattern model artifact, or None if unavailable"""
+    resolved = resolve_pattern_model_version(version, model_dir)
+    if resolved is None:
+        if version:
+            raise FileNotFoundError(f"Pattern model v{version} not found in {model_dir}")
+        return None
+    path = list_pattern_models(model_dir)[resolved]
+    
+    import joblib
+    import sklearn
+    artifact = joblib.load(path)
+    if artifact.get("feature_order") != FEATURE_ORDER:
+        raise ValueError(f"{path} was trained on a different feature set")
+    if artifact.get("sklearn_version") != sklearn.__version__:
+        print(f"Warning: {path} was trained with scikit-learn {artifact.get('sklearn_version')}, "
+              f"running {sklearn.__version__}")
+    return artifact
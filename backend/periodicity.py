@@ -0,0 +1,177 @@
+"""
+Dominant payment period of every merchant group at once.
+
+Works on the merchant-sorted columns (epoch days plus group offsets). Each
+interval between consecutive payments is tested against a fixed set of
+cadences and against the group's own median interval, allowing for up to
+PERIOD_MAX_SKIP missed payments. A cadence explains an interval when the
+interval is within tolerance of a whole number of periods and the average
+spacing over all explained intervals stays close to the period. Its score is the
+share of intervals it explains times the share of expected payments that
+actually happened, so a monthly plan with one skipped month still scores
+close to 1 while a quarterly plan scores low as "monthly, two skips each time".
+
+Everything is computed with whole-array operations across all groups, one
+pass per cadence.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+import config
+from columnar import day_of_month
+
+# (label, period in days, tolerance in days, calendar months per period or 0)
+CADENCES = [
+    ("Weekly", 7.0, 1.0, 0),
+    ("Monthly", 30.44, 4.0, 1),
+    ("Quarterly", 91.31, 7.0, 3),
+    ("Half-yearly", 182.62, 10.0, 6),
+    ("Yearly", 365.25, 12.0, 12),
+]
+# A group's median interval is also tried as its period when it lies in this range
+# (e.g. 28- or 84-day prepaid plans); shorter spacing is everyday spending
+CUSTOM_MIN_DAYS = 20
+CUSTOM_MAX_DAYS = 400
+# Cadences at least this long need one fitting interval instead of two: a
+# two-year statement holds only two payments of a yearly plan
+LONG_PERIOD_DAYS = 180
+# A calendar cadence keeps its usual day of the month only if payments stay
+# within this many days of it (median), and the first-to-last span is within
+# PHASE_MAX_DRIFT_DAYS of whole periods: a 30-day plan classed as monthly
+# drifts through the month and has no usual day
+PHASE_MAX_SPREAD_DAYS = 3
+PHASE_MAX_DRIFT_DAYS = 5
+# cadence code of a period taken from the group's median interval, and of no period
+CUSTOM = len(CADENCES)
+NONE = -1
+
+
+def _group_median(values: np.ndarray, group: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Upper median of `values` within each group (rows of a group are contiguous); NaN for empty groups"""
+    sizes = np.diff(offsets)
+    result = np.full(len(sizes), np.nan)
+    if len(values):
+        # Sorting by (group, value) keeps every group at its own offsets
+        ordered = values[np.lexsort((values, group))]
+        nonempty = sizes > 0
+        result[nonempty] = ordered[offsets[:-1][nonempty] + sizes[nonempty] // 2]
+    return result
+
+
+def detect_periods(days: np.ndarray, offsets: np.ndarray,
+                   min_regularity: float = config.PERIOD_MIN_REGULARITY,
+                   max_skip: int = config.PERIOD_MAX_SKIP) -> Dict[str, np.ndarray]:
+    """
+    Dominant period of each group; group i is rows offsets[i]:offsets[i + 1]
+    of `days` (epoch days, date-sorted within the group).
+    Returns arrays with one entry per group:
+      cadence     index into CADENCES, CUSTOM, or NONE when no period reaches
+                  min_regularity with at least two fitting intervals (one for
+                  cadences of LONG_PERIOD_DAYS or more)
+      period      period in days: the cadence's, or for CUSTOM the mean spacing
+                  of the intervals it explains (NaN for NONE)
+      regularity  score of the chosen period, 0-1
+      phase       median day of month for calendar cadences whose payments stay
+                  near it, median weekday (Monday = 0) for Weekly, -1 otherwise
+    """
+    days = np.asarray(days, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    sizes = np.diff(offsets)
+    n_groups = len(sizes)
+    group = np.repeat(np.arange(n_groups), sizes)
+    
+    # Intervals between consecutive payments, contiguous per group like their rows
+    first_rows = np.zeros(len(days), dtype=bool)
+    first_rows[offsets[:-1][sizes > 0]] = True
+    intervals = np.diff(days, prepend=days[:1])[~first_rows].astype(float)
+    interval_group = group[~first_rows]
+    n_intervals = np.maximum(sizes - 1, 0)
+    interval_offsets = np.concatenate([[0], np.cumsum(n_intervals)])
+    
+    custom = _group_median(intervals, interval_group, interval_offsets)
+    custom[(custom < CUSTOM_MIN_DAYS) | (custom > CUSTOM_MAX_DAYS)] = np.nan
+    
+    cadence = np.full(n_groups, NONE)
+    period = np.full(n_groups, np.nan)
+    regularity = np.zeros(n_groups)
+    trials = [(code, period_days, tolerance) for code, (_, period_days, tolerance, _) in enumerate(CADENCES)]
+    trials.append((CUSTOM, custom[interval_group], np.maximum(2.0, 0.1 * custom[interval_group])))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for code, trial_period, tolerance in trials:
+            steps = np.rint(intervals / trial_period)
+            fits = (steps >= 1) & (steps <= max_skip + 1) & (np.abs(intervals - steps * trial_period) <= tolerance)
+            fitted = np.bincount(interval_group, weights=fits, minlength=n_groups)
+            expected = np.bincount(interval_group, weights=np.where(fits, steps, 0), minlength=n_groups)
+            score = np.where(expected > 0, (fitted / n_intervals) * (fitted / expected), 0.0)
+            # Mean spacing of the explained intervals, per expected payment
+            spacing = np.bincount(interval_group, weights=np.where(fits, intervals, 0), minlength=n_groups) / expected
+            if code != CUSTOM:
+                # Every fit is within tolerance, but the average spacing must not drift:
+                # a 28-day plan fits "monthly" interval by interval yet is not monthly
+                score[np.abs(spacing - trial_period) > tolerance / 2] = 0.0
+            # Fixed cadences are tried first and keep ties against the custom period
+            min_fitted = 1 if code != CUSTOM and trial_period >= LONG_PERIOD_DAYS else 2
+            better = (score > regularity) & (fitted >= min_fitted) & (score >= min_regularity)
+            regularity[better] = score[better]
+            cadence[better] = code
+            period[better] = spacing[better] if code == CUSTOM else trial_period
+    
+    months = np.array([m for _, _, _, m in CADENCES] + [0])[np.where(cadence == NONE, CUSTOM, cadence)]
+    days_of_month = day_of_month(days)
+    dom = _group_median(days_of_month, group, offsets)
+    # Distance of each payment from the usual day, across month ends (30th vs 1st is 2 days)
+    offset = (days_of_month - np.nan_to_num(dom[group]) + 15) % 31 - 15
+    spread = _group_median(np.abs(offset), group, offsets)
+    span = np.zeros(n_groups)
+    nonempty = sizes > 0
+    span[nonempty] = days[offsets[1:][nonempty] - 1] - days[offsets[:-1][nonempty]]
+    with np.errstate(invalid='ignore'):
+        drift = np.abs(span - np.rint(span / period) * period)
+    dom[(spread > PHASE_MAX_SPREAD_DAYS) | (drift > PHASE_MAX_DRIFT_DAYS)] = np.nan
+    # 1970-01-01 was a Thursday
+    weekday = _group_median((days + 3) % 7, group, offsets)
+    phase = np.where(months > 0, dom, np.where(cadence == 0, weekday, -1))
+    phase = np.nan_to_num(phase, nan=-1).astype(np.int64)
+    
+    return {"cadence": cadence, "period": period, "regularity": regularity, "phase": phase}
+
+
+def is_long(cadence: np.ndarray) -> np.ndarray:
+    """Whether each cadence code is a fixed cadence of LONG_PERIOD_DAYS or more"""
+    long_codes = [code for code, (_, period, _, _) in enumerate(CADENCES) if period >= LONG_PERIOD_DAYS]
+    return np.isin(cadence, long_codes)
+
+
+def frequency_label(cadence: int, period: float) -> Optional[str]:
+    if cadence == NONE:
+        return None
+    if cadence == CUSTOM:
+        return f"Every {int(round(period))} days"
+    return CADENCES[cadence][0]
+
+
+def next_payment_date(last_date: pd.Timestamp, frequency: str, period: float, phase: int) -> pd.Timestamp:
+    """
+    Next expected payment after `last_date`. Calendar cadences land on their
+    usual day of the month (clamped to the month's length) nearest to one
+    period later, so a payment made a few days early or late does not shift
+    the prediction by a month; weekly ones land on their usual weekday. Custom
+    periods, and cadences without a stable phase, just add the period.
+    """
+    cadence = next((c for c in CADENCES if c[0] == frequency), None)
+    if cadence is None or phase < 0:
+        return last_date + pd.Timedelta(days=int(round(period)))
+    _, _, _, months = cadence
+    if months:
+        target = last_date + pd.DateOffset(months=months)
+        candidates = []
+        for shift in (-1, 0, 1):
+            first = (target + pd.DateOffset(months=shift)).replace(day=1)
+            candidates.append(first.replace(day=min(phase, first.days_in_month)))
+        return min((c for c in candidates if c > last_date), key=lambda c: abs(c - target))
+    target = last_date + pd.Timedelta(days=7)
+    # Nearest day to one week later that falls on the usual weekday
+    shift = (phase - target.weekday()) % 7
+    return target + pd.Timedelta(days=shift - 7 if shift > 3 else shift)
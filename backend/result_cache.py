@@ -0,0 +1,150 @@
+"""
+Cache of complete /analyze responses.
+
+Keys combine the SHA-256 of the uploaded bytes with the analysis version
+(keyword tables, model, config and the current date), so any change that
+could alter a response simply stops matching old entries. Entries live in
+an in-process LRU and, when `cache_dir` is set, as JSON files on disk; both
+expire after `ttl` seconds.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from metrics import sample_lines
+
+# Expired files are swept from the disk tier every this many writes
+SWEEP_EVERY = 100
+
+
+def result_key(content_digest: str, version: str) -> str:
+    return hashlib.sha256(f"{content_digest}:{version}".encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_items: int = 256, ttl: float = 3600, cache_dir: Optional[str] = None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            except OSError as e:
+                print(f"Warning: Result cache disk tier disabled: {e}")
+                self.cache_dir = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0 or self.cache_dir is not None
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, result = entry
+                if now - stored_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return result
+                del self._memory[key]
+
+        result = self._read_disk(key, now)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, result, now)
+        return result
+
+    def put(self, key: str, result: Dict):
+        now = time.time()
+        with self._lock:
+            self._remember(key, result, now)
+        self._write_disk(key, result)
+
+    def metric_lines(self) -> List[str]:
+        """Hit/miss counters in Prometheus text format"""
+        lines = []
+        for key in ("memory_hits", "disk_hits", "misses"):
+            lines += sample_lines(f"subdetect_result_cache_{key}_total", "counter",
+                                  f"Response cache {key.replace('_', ' ')}", getattr(self, key))
+        return lines
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "memory_items": len(self._memory),
+        }
+
+    # ============= INTERNALS =============
+    def _remember(self, key: str, result: Dict, stored_at: float):
+        if self.max_items <= 0:
+            return
+        self._memory[key] = (stored_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str, now: float) -> Optional[Dict]:
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            if now - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key: str, result: Dict):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Warning: Could not write result cache entry: {e}")
+            return
+
+        self._writes += 1
+        if self._writes % SWEEP_EVERY == 0:
+            self._sweep()
+
+    def _sweep(self):
+        """Delete expired entries from the disk tier"""
+        cutoff = time.time() - self.ttl
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,164 @@
+"""
+Pre-fork server: load the models once, then fork HTTP workers that share them.
+
+`uvicorn main:app --workers N` starts every worker from scratch, so each one
+imports torch and loads its own sentence-transformer, pattern model and keyword
+tables. Here the parent imports the app and loads all of that first, then forks
+the workers: model weights, keyword automata and the embedding cache's memory
+map are shared copy-on-write, and a worker only pays for the pages it writes.
+
+Each worker runs uvicorn on the shared listening socket and analyzes on threads
+with the detector it inherited (ANALYSIS_WORKERS is forced to 0: a process pool
+per worker would load the models again). The parent never serves requests; it
+restarts workers that exit and passes SIGINT/SIGTERM on to them.
+
+Jobs, the in-memory result cache and /metrics are per worker. Set
+SUBDETECT_RESULT_CACHE_DIR to share cached results. Needs fork (Linux/macOS).
+
+Usage:
+    python serve.py [--host 0.0.0.0] [--port 8000] [--workers N]
+"""
+import os
+
+# Before config is imported anywhere
+os.environ["SUBDETECT_ANALYSIS_WORKERS"] = "0"
+# The tokenizer's thread pool does not survive fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+import argparse
+import gc
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
+
+import config
+
+# Seconds between restarts, so a worker that crashes on start does not spin
+RESTART_DELAY = 1.0
+
+
+def preload():
+    """Import the app and load every model in this process; returns the app"""
+    import main
+    import pipeline
+
+    models = pipeline.get_detector().warm_up()
+    print(f"Models loaded in parent {os.getpid()}: {models}")
+    # Objects that exist now are never collected; keeping the collector off
+    # them stops it from writing to (and so copying) their pages in every worker
+    gc.collect()
+    gc.freeze()
+    return main.app
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, workers: int):
+    import uvicorn
+
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        # Workers together should not start more math threads than there are cores
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+    server = uvicorn.Server(uvicorn.Config(app, lifespan="on"))
+    server.run(sockets=[sock])
+
+
+def fork_worker(app, sock: socket.socket, workers: int) -> int:
+    # Buffered output would otherwise be written again by the child
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid:
+        return pid
+    # Child: uvicorn installs its own handlers for a graceful shutdown
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    code = 0
+    try:
+        run_worker(app, sock, workers)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Skip the parent's atexit handlers and finalizers
+        os._exit(code)
+
+
+def serve(host: str, port: int, workers: int) -> int:
+    app = preload()
+    # Threads do not survive fork; anything holding a lock in one would deadlock the workers
+    running = [t.name for t in threading.enumerate() if t is not threading.main_thread()]
+    if running:
+        print(f"Warning: Threads running before fork ({', '.join(running)}); workers may hang")
+
+    try:
+        sock = bind_socket(host, port)
+    except OSError as e:
+        print(f"Cannot listen on {host}:{port}: {e}", file=sys.stderr)
+        return 1
+
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for slot in range(workers):
+        children[fork_worker(app, sock, workers)] = slot
+    print(f"Serving on {host}:{port} with {workers} workers: {sorted(children)}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        slot = children.pop(pid, None)
+        if slot is None or stopping:
+            continue
+        print(f"Warning: Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+        time.sleep(RESTART_DELAY)
+        if not stopping:
+            children[fork_worker(app, sock, workers)] = slot
+
+    sock.close()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the API from workers forked after the models are loaded")
+    parser.add_argument("--host", default=config.SERVE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=config.SERVE_WORKERS)
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, "fork"):
+        print("serve.py needs fork; use `uvicorn main:app` on this platform", file=sys.stderr)
+        return 1
+    return serve(args.host, args.port, max(1, args.workers))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Streamed /analyze responses (Accept: application/x-ndjson).
+
+The worker emits one record per detected item as soon as it is scored and
+a closing summary built from running totals; records travel back through the
+engine's progress channel and are written out as JSON Lines:
+  {"type": "stage", "stage": "parse"}          a pipeline stage started
+  {"type": "item", "item": {...}}              one entry of "subscriptions"
+  {"type": "summary", "status", "message", "insights"}   last record on success
+  {"type": "error", "error": ...}              last record on failure
+Items arrive in scoring order, not sorted by amount.
+"""
+import asyncio
+import uuid
+from typing import AsyncIterator, Dict, List, Optional
+
+from engine import AnalysisEngine, EngineBusy
+from pipeline import build_response, stream_statement_file
+from result_cache import ResultCache
+from uploads import remove_spooled
+
+NDJSON = "application/x-ndjson"
+# How long to wait for the closing record once the task has returned
+# (it is sent through the progress channel just before)
+CLOSING_RECORD_WAIT = 5.0
+
+
+def wants_stream(accept: Optional[str]) -> bool:
+    return bool(accept) and NDJSON in accept
+
+
+def cached_records(payload: Dict) -> List[Dict]:
+    """A cached /analyze payload as stream records"""
+    if "error" in payload:
+        return [{"type": "error", **payload}]
+    records = [{"type": "item", "item": item} for item in payload["subscriptions"]]
+    records.append({"type": "summary", "status": payload["status"], "message": payload["message"],
+                    "insights": payload["insights"]})
+    return records
+
+
+def stream_analysis(engine: AnalysisEngine, path: str, cache: Optional[ResultCache] = None,
+                    key: Optional[str] = None, debug: bool = False) -> AsyncIterator[Dict]:
+    """
+    Start analyzing the spooled upload at `path` and return its records.
+    Call from the event loop. The analysis runs and `path` is removed once it
+    finishes whether or not the records are read (the client may be gone).
+    A successful result is stored in `cache` under `key`, in the plain /analyze form.
+    """
+    loop = asyncio.get_running_loop()
+    records: asyncio.Queue = asyncio.Queue()
+    token = uuid.uuid4().hex
+    stage_token, record_token = f"{token}:stage", f"{token}:record"
+
+    def on_stage(stage: str):
+        loop.call_soon_threadsafe(records.put_nowait, {"type": "stage", "stage": stage})
+
+    def on_record(record: Dict):
+        loop.call_soon_threadsafe(records.put_nowait, record)
+
+    stage_reporter = engine.progress_reporter(stage_token, on_stage)
+    record_reporter = engine.progress_reporter(record_token, on_record)
+    task = asyncio.ensure_future(engine.run(stream_statement_file, path, record_reporter, stage_reporter,
+                                            with_timings=True))
+
+    def finished(_):
+        engine.release_reporter(stage_token)
+        engine.release_reporter(record_token)
+        remove_spooled(path)
+
+    task.add_done_callback(finished)
+    return _records(task, records, cache, key, debug)
+
+
+async def _records(task: asyncio.Future, records: asyncio.Queue, cache: Optional[ResultCache],
+                   key: Optional[str], debug: bool) -> AsyncIterator[Dict]:
+    items: List[Dict] = []
+    while True:
+        getter = asyncio.ensure_future(records.get())
+        await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+        if not getter.done() and task.exception() is not None:
+            getter.cancel()
+            error = task.exception()
+            yield {"type": "error", "error": ("Server busy, please retry shortly." if isinstance(error, EngineBusy)
+                                              else f"Analysis failed: {error}")}
+            return
+        if getter.done():
+            record = getter.result()
+        else:
+            try:
+                record = await asyncio.wait_for(getter, CLOSING_RECORD_WAIT)
+            except asyncio.TimeoutError:
+                # The closing record was lost on the way; the task returned it as well
+                record = task.result()[0]
+
+        if record["type"] == "item":
+            items.append(record["item"])
+        elif record["type"] in ("summary", "error"):
+            _, timings = await task
+            insights = record.get("insights", {})
+            complete = len(items) == insights.get("total_subscriptions", 0) + insights.get("total_patterns", 0)
+            if cache is not None and cache.enabled and key is not None and record["type"] == "summary" and complete:
+                cache.put(key, build_response(items))
+            yield dict(record, timings=timings) if debug else record
+            return
+        yield record
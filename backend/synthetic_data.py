@@ -0,0 +1,220 @@
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+# (merchant narration, typical amount, cadence in days)
+SUBSCRIPTION_MERCHANTS = [
+    ("NETFLIX", 649, 30), ("SPOTIFY", 119, 30), ("YOUTUBE PREMIUM", 129, 30),
+    ("BHARTI AIRTEL", 399, 28), ("JIO FIBER", 999, 30), ("ADOBE", 4230, 30),
+    ("GITHUB", 830, 30), ("GOOGLE ONE", 130, 30), ("NOTION", 820, 30),
+    ("CHATGPT", 1999, 30), ("HOTSTAR", 299, 90), ("SWIGGY ONE", 299, 90),
+    ("HDFC LIFE INSURANCE", 5000, 90), ("LIC PREMIUM", 12000, 365),
+    ("AMAZON PRIME", 1499, 365), ("ICICI PRU SIP", 5000, 30),
+    ("BESCOM ELECTRICITY", 1200, 30), ("SMALLCASE", 100, 30),
+]
+
+# (merchant narration, min amount, max amount)
+NOISE_MERCHANTS = [
+    ("SWIGGY", 120, 900), ("ZOMATO", 150, 1100), ("UBER", 90, 600),
+    ("FLIPKART", 300, 8000), ("DMART", 400, 4000), ("TEA STALL", 10, 60),
+    ("PETROL PUMP", 500, 3000), ("MYNTRA", 600, 5000), ("BLINKIT", 100, 1500),
+    ("SURESH", 200, 5000), ("MEDPLUS", 80, 900), ("STARBUCKS", 250, 700),
+]
+
+# Extra cadences used by the scaled generator (the training corpus sticks to the list above)
+WEEKLY_SUBSCRIPTION_MERCHANTS = [
+    ("CULT FIT", 199, 7), ("MILKBASKET", 420, 7), ("TIMES PRIME", 99, 7),
+]
+
+# Word lists combined into many distinct noise merchants for large statements
+NOISE_PREFIXES = ["SRI", "NEW", "ROYAL", "GREEN", "CITY", "STAR", "HAPPY", "GOLDEN", "MODERN", "FRESH",
+                  "LAKSHMI", "GANESH", "OM", "SAI", "BALAJI", "KRISHNA", "NATIONAL", "UNITED", "METRO", "URBAN"]
+NOISE_SUFFIXES = ["STORES", "MART", "BAKERY", "MEDICALS", "TRADERS", "CAFE", "TEXTILES", "HARDWARE",
+                  "ENTERPRISES", "SUPERMARKET", "RESTAURANT", "FUELS", "OPTICALS", "AGENCIES", "SWEETS"]
+
+BANK_CODES = ['HDFC', 'ICIC', 'SBIN', 'UTIB', 'YESB']
+
+# Export layouts of the banks we see most: preamble lines, column header, date format,
+# and which column carries the narration and the debit amount
+STATEMENT_LAYOUTS: Dict[str, Dict] = {
+    "default": {
+        "preamble": [],
+        "columns": ["Date", "Description", "Debit", "Credit", "Balance"],
+        "date_format": "%d-%m-%Y",
+    },
+    "hdfc": {
+        "preamble": ["HDFC BANK Ltd.", "Statement of account", "Account No :,50100012345678", ""],
+        "columns": ["Date", "Narration", "Chq./Ref.No.", "Value Dt", "Withdrawal Amt.", "Deposit Amt.",
+                    "Closing Balance"],
+        "date_format": "%d/%m/%y",
+    },
+    "sbi": {
+        "preamble": ["Account Name :,SYNTHETIC USER", "Account Number :,00000012345678901",
+                     "Branch :,MG ROAD", ""],
+        "columns": ["Txn Date", "Value Date", "Description", "Ref No./Cheque No.", "Debit", "Credit",
+                    "Balance"],
+        "date_format": "%d %b %Y",
+    },
+    "icici": {
+        "preamble": ["DETAILED STATEMENT", "Transactions List - SYNTHETIC USER (INR) - 000401234567", ""],
+        "columns": ["S No.", "Value Date", "Transaction Date", "Cheque Number", "Transaction Remarks",
+                    "Withdrawal Amount (INR )", "Deposit Amount (INR )", "Balance (INR )"],
+        "date_format": "%d/%m/%Y",
+    },
+}
+
+
+def _narration(merchant: str, rng: np.random.Generator) -> str:
+    """Render a merchant as one of the bank narration styles clean_merchant_name handles"""
+    style = rng.integers(0, 3)
+    ref = rng.integers(10**11, 10**12)
+    bank = BANK_CODES[rng.integers(0, len(BANK_CODES))] if style == 0 else None
+    return _render_narration(merchant, style, ref, bank)
+
+
+def _render_narration(merchant: str, style: int, ref: int, bank: Optional[str]) -> str:
+    """Narration text for already drawn style (0 UPI, 1 POS, 2 bare name), reference and bank code"""
+    if style == 0:
+        handle = merchant.lower().replace(' ', '')
+        return f"UPI/DR/{ref}/{merchant}/{bank}/{handle}@{bank.lower()}/Payment"
+    if style == 1:
+        return f"POS ATM PURCH {merchant} {ref}"
+    return merchant
+
+
+def generate_statement(months: int = 12, n_subscriptions: int = 6, noise_per_month: int = 15,
+                       seed: Optional[int] = None, start: date = date(2024, 1, 1)) -> pd.DataFrame:
+    """
+    Generate a synthetic bank statement with recurring subscriptions and noise spending.
+    Columns match the sample CSVs in data/: Date, Description, Debit, Credit, Balance
+    """
+    rng = np.random.default_rng(seed)
+    end = start + timedelta(days=30 * months)
+    rows = []
+
+    picks = rng.choice(len(SUBSCRIPTION_MERCHANTS), size=min(n_subscriptions, len(SUBSCRIPTION_MERCHANTS)),
+                       replace=False)
+    for idx in picks:
+        merchant, amount, cadence = SUBSCRIPTION_MERCHANTS[idx]
+        day = start + timedelta(days=int(rng.integers(0, min(cadence, 28))))
+        while day < end:
+            rows.append((day, _narration(merchant, rng), float(amount)))
+            jitter = int(rng.integers(-2, 3)) if cadence >= 28 else 0
+            day += timedelta(days=cadence + jitter)
+
+    n_noise = noise_per_month * months
+    noise_idx = rng.integers(0, len(NOISE_MERCHANTS), size=n_noise)
+    noise_days = rng.integers(0, (end - start).days, size=n_noise)
+    for idx, offset in zip(noise_idx, noise_days):
+        merchant, low, high = NOISE_MERCHANTS[idx]
+        amount = round(float(rng.uniform(low, high)), 2)
+        rows.append((start + timedelta(days=int(offset)), _narration(merchant, rng), amount))
+
+    df = pd.DataFrame(rows, columns=['date', 'Description', 'Debit']).sort_values('date', kind='stable')
+    df['Credit'] = 0.0
+    df['Balance'] = (100000.0 - df['Debit'].cumsum()).round(2)
+    df.insert(0, 'Date', df.pop('date').map(lambda d: d.strftime('%d-%m-%Y')))
+    return df.reset_index(drop=True)
+
+
+def statement_to_csv(df: pd.DataFrame) -> str:
+    """Serialize a generated statement the way a bank export would look"""
+    return df.to_csv(index=False, float_format='%.2f')
+
+
+# ============= SCALED STATEMENTS =============
+def _narrations(merchants: np.ndarray, rng: np.random.Generator) -> List[str]:
+    """_narration for every merchant name, with the random draws made as whole arrays"""
+    n = len(merchants)
+    styles = rng.integers(0, 3, size=n)
+    refs = rng.integers(10**11, 10**12, size=n)
+    banks = np.array(BANK_CODES)[rng.integers(0, len(BANK_CODES), size=n)]
+    return [_render_narration(merchant, style, ref, bank)
+            for merchant, style, ref, bank in zip(merchants, styles, refs, banks)]
+
+
+def generate_scaled_statement(n_rows: int, months: int = 24, n_subscriptions: int = 10,
+                              n_noise_merchants: int = 200, jitter_days: int = 2,
+                              layout: str = "default", seed: Optional[int] = None,
+                              start: date = date(2024, 1, 1)) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Generate a statement of about `n_rows` transactions in one of STATEMENT_LAYOUTS.
+    Subscriptions recur weekly, monthly, quarterly or yearly with up to
+    `jitter_days` of jitter (scaled down for weekly ones); every other row is
+    noise spread over `n_noise_merchants` distinct merchants.
+    Returns (statement, names of the generated subscriptions).
+    """
+    rng = np.random.default_rng(seed)
+    n_days = 30 * months
+    catalogue = SUBSCRIPTION_MERCHANTS + WEEKLY_SUBSCRIPTION_MERCHANTS
+
+    # Recurring payments
+    dates, merchants, amounts = [], [], []
+    picks = rng.choice(len(catalogue), size=min(n_subscriptions, len(catalogue)), replace=False)
+    for idx in picks:
+        merchant, amount, cadence = catalogue[idx]
+        jitter = min(jitter_days, cadence // 7)
+        n = n_days // cadence + 1
+        offsets = int(rng.integers(0, min(cadence, 28))) + cadence * np.arange(n)
+        offsets = offsets + rng.integers(-jitter, jitter + 1, size=n)
+        offsets = offsets[(offsets >= 0) & (offsets < n_days)]
+        dates.append(offsets)
+        merchants.append(np.full(len(offsets), merchant, dtype=object))
+        amounts.append(np.full(len(offsets), float(amount)))
+    subscription_names = [catalogue[idx][0] for idx in picks]
+
+    # Noise: the fixed noise merchants plus generated local ones
+    names = [m for m, _, _ in NOISE_MERCHANTS]
+    ranges = [(low, high) for _, low, high in NOISE_MERCHANTS]
+    for i in range(max(0, n_noise_merchants - len(names))):
+        prefix = NOISE_PREFIXES[i % len(NOISE_PREFIXES)]
+        suffix = NOISE_SUFFIXES[(i // len(NOISE_PREFIXES)) % len(NOISE_SUFFIXES)]
+        branch = i // (len(NOISE_PREFIXES) * len(NOISE_SUFFIXES))
+        names.append(f"{prefix} {suffix}" + (f" {chr(ord('A') + branch % 26)}" if branch else ""))
+        low = float(rng.integers(20, 2000))
+        ranges.append((low, low * float(rng.uniform(1.5, 5))))
+
+    n_noise = max(0, n_rows - sum(len(d) for d in dates))
+    # Skewed popularity: a few merchants get most of the spend, like real statements
+    weights = 1.0 / np.arange(1, len(names) + 1)
+    noise_idx = rng.choice(len(names), size=n_noise, p=weights / weights.sum())
+    lows = np.array([r[0] for r in ranges])[noise_idx]
+    highs = np.array([r[1] for r in ranges])[noise_idx]
+    dates.append(rng.integers(0, n_days, size=n_noise))
+    merchants.append(np.array(names, dtype=object)[noise_idx])
+    amounts.append(np.round(rng.uniform(lows, highs), 2))
+
+    day_offsets = np.concatenate(dates)
+    order = np.argsort(day_offsets, kind='stable')
+    day_offsets = day_offsets[order]
+    merchant_names = np.concatenate(merchants)[order]
+    debits = np.concatenate(amounts)[order]
+
+    spec = STATEMENT_LAYOUTS[layout]
+    columns = spec["columns"]
+    # Format each calendar day once; rows just index into them
+    day_labels = (pd.Timestamp(start) + pd.to_timedelta(np.arange(n_days), unit='D')).strftime(spec["date_format"])
+    txn_dates = np.asarray(day_labels, dtype=object)[day_offsets]
+    n = len(day_offsets)
+    balance = np.round(10.0**7 - np.cumsum(debits), 2)
+    refs = rng.integers(10**11, 10**12, size=n).astype(str)
+
+    df = pd.DataFrame(index=range(n))
+    for column in columns:
+        lower = column.lower()
+        if lower.startswith("s no"):
+            df[column] = np.arange(1, n + 1)
+        elif "date" in lower or lower in ("value dt",):
+            df[column] = txn_dates
+        elif any(k in lower for k in ("description", "narration", "remarks")):
+            df[column] = _narrations(merchant_names, rng)
+        elif "ref" in lower or "cheque" in lower:
+            df[column] = refs
+        elif "debit" in lower or "withdrawal" in lower:
+            df[column] = debits
+        elif "credit" in lower or "deposit" in lower:
+            df[column] = 0.0
+        else:
+            df[column] = balance
+    return df, subscription_names
@@ -0,0 +1,66 @@
+import io
+
+import pandas as pd
+import pytest
+
+import pipeline
+from accounts import AccountStore, transaction_keys, update_account
+from ml_detector import SubscriptionDetector
+
+
+@pytest.fixture(autouse=True)
+def lite_detector(monkeypatch):
+    monkeypatch.setattr(pipeline, "_detector", SubscriptionDetector(text_backend="lite"))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AccountStore(str(tmp_path / "accounts.sqlite3"))
+
+
+def statement(months):
+    lines = ["Date,Description,Debit,Credit,Balance"]
+    for month in months:
+        lines.append(f"05-{month:02d}-2024,NETFLIX,649.00,0.00,10000.00")
+        lines.append(f"09-{month:02d}-2024,SPOTIFY INDIA,119.00,0.00,10000.00")
+        # Two identical purchases on one day are two transactions
+        lines += [f"12-{month:02d}-2024,TEA STALL,20.00,0.00,10000.00"] * 2
+    return io.BytesIO(("\n".join(lines) + "\n").encode("utf-8"))
+
+
+def test_keys_separate_same_day_repeats_and_match_on_reupload():
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2024-01-12", "2024-01-12", "2024-01-13"]),
+        "description": ["TEA STALL", "TEA STALL", "TEA STALL"],
+        "amount": [20.0, 20.0, 20.0],
+    })
+    keys = transaction_keys(df)
+    assert len(set(keys)) == 3
+    assert transaction_keys(df.copy()) == keys
+    # A key does not depend on the other rows in the upload
+    assert transaction_keys(df.iloc[[2]]) == keys[2:]
+
+
+def test_overlapping_uploads_only_add_new_rows(store):
+    first = update_account("acct-1", statement(range(1, 7)), store=store)
+    assert first["account"]["new_transactions"] == 24
+    assert first["account"]["duplicate_transactions"] == 0
+
+    second = update_account("acct-1", statement(range(4, 10)), store=store)
+    assert second["account"]["new_transactions"] == 12
+    assert second["account"]["duplicate_transactions"] == 12
+    assert second["account"]["total_transactions"] == 36
+    netflix = [item for item in second["subscriptions"] if item["UnifiedName"].upper() == "NETFLIX"]
+    assert len(netflix) == 1
+    assert netflix[0]["TransactionCount"] == 9
+    assert netflix[0]["LastDate"] == "2024-09-05"
+
+
+def test_reuploading_the_same_statement_adds_nothing(store):
+    update_account("acct-2", statement(range(1, 7)), store=store)
+    again = update_account("acct-2", statement(range(1, 7)), store=store)
+    assert again["account"]["new_transactions"] == 0
+    assert again["account"]["total_transactions"] == 24
+    # Accounts are kept apart
+    other = update_account("acct-3", statement(range(1, 7)), store=store)
+    assert other["account"]["new_transactions"] == 24
@@ -0,0 +1,28 @@
+import pytest
+
+from ml_detector import SubscriptionDetector
+from synthetic_data import NOISE_MERCHANTS, SUBSCRIPTION_MERCHANTS
+
+DISTINCT_PAIRS = [
+    ("SWIGGY ONE", "SWIGGY"), ("AMAZON PRIME", "AMAZON"), ("ZOMATO PRO", "ZOMATO"), ("UBER EATS", "UBER"),
+    ("GOOGLE PLAY", "GOOGLE ONE"), ("GOOGLE CLOUD", "GOOGLE ONE"), ("CITY MART", "SRI MART"),
+    ("CITY STORES", "SRI STORES"),
+]
+
+
+@pytest.fixture(scope="module")
+def mapping():
+    names = {name for pair in DISTINCT_PAIRS for name in pair}
+    names.update(name for name, _, _ in SUBSCRIPTION_MERCHANTS + NOISE_MERCHANTS)
+    names.update(["SPOTIFY INDIA", "Spotify India", "BHARTI AIRTEL LTD"])
+    return SubscriptionDetector(text_backend="lite").cluster_merchants(sorted(names))
+
+
+@pytest.mark.parametrize("a, b", DISTINCT_PAIRS)
+def test_lite_backend_keeps_distinct_merchants_apart(mapping, a, b):
+    assert mapping[a] != mapping[b]
+
+
+def test_lite_backend_merges_spelling_variants(mapping):
+    assert mapping["Spotify India"] == mapping["SPOTIFY INDIA"]
+    assert mapping["BHARTI AIRTEL LTD"] == mapping["BHARTI AIRTEL"]
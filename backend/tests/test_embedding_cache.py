@@ -0,0 +1,34 @@
+import os
+
+import numpy as np
+import pytest
+
+from embedding_cache import EmbeddingCache
+
+
+def fake_encode(texts):
+    return np.array([[len(t), sum(map(ord, t)), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_vectors_round_trip_through_disk(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", max_items=10)
+    first = cache.encode(["netflix", "spotify"], fake_encode)
+
+    reopened = EmbeddingCache(str(tmp_path), "model", max_items=10)
+    assert np.array_equal(reopened.encode(["spotify", "netflix"], fake_encode), first[::-1])
+    assert reopened.stats()["disk_hits"] == 2
+    assert reopened.stats()["misses"] == 0
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc")
+def test_appends_do_not_keep_old_mappings_open(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", max_items=1000)
+    cache.encode(["warm"], fake_encode)
+    open_fds = len(os.listdir("/proc/self/fd"))
+    for i in range(300):
+        cache.encode([f"merchant {i}"], fake_encode)
+    assert len(os.listdir("/proc/self/fd")) <= open_fds + 2
+    # Memory-tier entries still read back correctly from the latest map
+    assert np.array_equal(cache.encode(["merchant 7", "warm"], fake_encode),
+                          fake_encode(["merchant 7", "warm"]))
+    assert cache.stats()["memory_hits"] == 2
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+import engine
+import pipeline
+from encode_batcher import EncodeBatcher
+from ml_detector import SubscriptionDetector
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    detector = SubscriptionDetector(text_backend="lite")
+    detector.encoder = EncodeBatcher(lambda texts: np.zeros((len(texts), 2)), max_wait_ms=10)
+    monkeypatch.setattr(pipeline, "_detector", detector)
+    return detector
+
+
+def test_unshared_worker_does_not_wait_for_encode_batches(detector):
+    engine._init_worker(False)
+    assert detector.encode_batch_wait_ms == 0
+    assert detector.encoder.max_wait == 0
+
+
+def test_shared_threads_keep_the_batch_wait(detector):
+    engine._init_worker(True)
+    assert detector.encoder.max_wait == pytest.approx(0.01)
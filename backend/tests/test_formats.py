@@ -0,0 +1,73 @@
+import gzip
+import io
+import zipfile
+
+import pytest
+
+from formats import FormatError, is_statement_name, open_csv, sniff_format
+
+CSV = b"Date,Description,Debit\n05-01-2024,NETFLIX,649.00\n"
+
+
+def zipped(*names):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name in names:
+            archive.writestr(name, CSV)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("content, expected", [
+    (CSV, "csv"),
+    (b"\xef\xbb\xbfDate,Description\n", "csv"),
+    (b"", "csv"),
+    (gzip.compress(CSV), "gzip"),
+    (zipped("statement.csv"), "zip"),
+    (b"PAR1\x15\x04", "parquet"),
+    (b"ARROW1\x00\x00", "arrow"),
+    (b"\xff\xff\xff\xff\x10\x01\x00\x00", "arrow_stream"),
+])
+def test_sniff_format_by_magic_bytes(content, expected):
+    f = io.BytesIO(content)
+    f.seek(len(content))
+    assert sniff_format(f) == expected
+    assert f.tell() == 0
+
+
+def test_sniff_format_on_pyarrow_output():
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.feather
+    import pyarrow.parquet
+
+    table = pa.table({"Date": ["05-01-2024"], "Description": ["NETFLIX"], "Debit": [649.0]})
+    written = {}
+    for fmt, write in [
+        ("parquet", lambda sink: pyarrow.parquet.write_table(table, sink)),
+        ("arrow", lambda sink: pyarrow.feather.write_feather(table, sink)),
+        ("arrow_stream", lambda sink: pa.ipc.new_stream(sink, table.schema).write_table(table)),
+    ]:
+        sink = io.BytesIO()
+        write(sink)
+        written[fmt] = sink.getvalue()
+    for fmt, content in written.items():
+        assert sniff_format(io.BytesIO(content)) == fmt
+
+
+@pytest.mark.parametrize("content", [CSV, gzip.compress(CSV), zipped("statement.csv", "__MACOSX/._statement.csv")])
+def test_open_csv_yields_the_csv_bytes(content):
+    f = io.BytesIO(content)
+    with open_csv(f, sniff_format(f)) as stream:
+        assert stream.read() == CSV
+
+
+def test_zip_with_several_csvs_is_rejected():
+    f = io.BytesIO(zipped("a.csv", "b.csv"))
+    with pytest.raises(FormatError, match="holds 2 CSV files"):
+        with open_csv(f, "zip"):
+            pass
+
+
+def test_statement_names():
+    assert all(is_statement_name(name) for name in
+               ["jan.csv", "JAN.CSV.GZ", "jan.zip", "jan.parquet", "jan.pq", "jan.feather", "jan.arrows"])
+    assert not is_statement_name("jan.xlsx")
@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from layouts import guess_date_format, parse_dates
+
+
+@pytest.mark.parametrize("values, expected", [
+    # 05/06 reads either way; statements here are day-first
+    (["05/06/2024", "07/06/2024"], "%d/%m/%Y"),
+    (["01/02/2024", "13/02/2024"], "%d/%m/%Y"),
+    (["01-02-2024 10:00", "13-02-2024 11:30"], "%d-%m-%Y %H:%M"),
+    (["01 Feb 2024", "13 Feb 2024"], "%d %b %Y"),
+    # Not guessable from the first value: left to inference
+    (["12/01/24", "31/01/24"], None),
+    (["not a date"], None),
+    ([], None),
+])
+def test_guess_date_format(values, expected):
+    assert guess_date_format(pd.Series(values, dtype=object)) == expected
+
+
+@pytest.mark.filterwarnings("ignore:Could not infer format")
+@pytest.mark.parametrize("values", [
+    ["05/06/2024", "07/06/2024", "12/06/2024"],
+    ["12/01/24", "31/01/24"],
+    ["01 Feb 2024", "13 Feb 2024"],
+])
+def test_parsing_with_the_guess_matches_day_first_inference(values):
+    values = pd.Series(values, dtype=object)
+    parsed = parse_dates(values, guess_date_format(values))
+    assert parsed.equals(pd.to_datetime(values, dayfirst=True))
+    assert parsed.iloc[0].day == int(values.iloc[0][:2])
+
+
+def test_values_the_format_misses_fall_back_to_day_first_inference():
+    parsed = parse_dates(pd.Series(["05/06/2024", "07-06-2024", None], dtype=object), "%d/%m/%Y")
+    assert parsed.tolist()[:2] == [pd.Timestamp(2024, 6, 5), pd.Timestamp(2024, 6, 7)]
+    assert pd.isna(parsed.iloc[2])
@@ -0,0 +1,22 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import clean_merchant_name, normalize_merchant_names
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+EDGE_ROWS = ["", "   ", "12345678901234", "0000", "---", "/ / /", "UPI/123456789012/", "!!?", np.nan, None]
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(DATA_DIR, "*.csv"))), ids=os.path.basename)
+def test_matches_row_by_row_cleaning_on_samples(path):
+    descriptions = pd.read_csv(path)["Description"]
+    assert normalize_merchant_names(descriptions).equals(descriptions.apply(clean_merchant_name))
+
+
+def test_matches_row_by_row_cleaning_on_edge_rows():
+    descriptions = pd.Series(EDGE_ROWS + ["NETFLIX", "", "UPI-SWIGGY-123456"], dtype=object, name="Description")
+    assert normalize_merchant_names(descriptions).equals(descriptions.apply(clean_merchant_name))
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from ml_detector import SubscriptionDetector, build_pattern_detector
+from ml_features import FEATURE_ORDER
+
+
+@pytest.fixture
+def detector():
+    return SubscriptionDetector(text_backend="lite")
+
+
+def feature_rows(n, seed=0):
+    """Feature matrix of `n` steady monthly subscriptions at different prices"""
+    rng = np.random.default_rng(seed)
+    rows = np.zeros((n, len(FEATURE_ORDER)))
+    column = {name: i for i, name in enumerate(FEATURE_ORDER)}
+    amounts = rng.uniform(99, 2000, n)
+    rows[:, column['transaction_count']] = 12
+    rows[:, column['avg_interval_days']] = rng.uniform(29.5, 31, n)
+    rows[:, column['avg_amount']] = amounts
+    rows[:, column['amount_consistency']] = 1.0
+    rows[:, column['total_spent']] = amounts * 12
+    rows[:, column['max_amount']] = amounts
+    rows[:, column['min_amount']] = amounts
+    rows[:, column['is_monthly_pattern']] = 1
+    return rows
+
+
+def test_trained_model_scores_without_rejecting(detector):
+    model = build_pattern_detector().fit(feature_rows(200))
+    detector.pattern_detector = model
+    detector.pattern_model_version = 1
+    matrix = feature_rows(10, seed=1)
+    # Far outside the training corpus: the model's own verdict is "outlier"
+    matrix[0, FEATURE_ORDER.index('avg_amount')] = 50000
+    assert model.predict(matrix[:1])[0] == -1
+
+    predictions, scores = detector.detect_subscription_patterns(matrix)
+    assert predictions.tolist() == [1] * 10
+    assert np.allclose(scores, model.score_samples(matrix))
+
+
+def test_fresh_forest_scores_without_rejecting(detector):
+    matrix = feature_rows(30)
+    predictions, scores = detector.detect_subscription_patterns(matrix)
+    assert predictions.tolist() == [1] * 30
+    assert len(scores) == 30
+
+
+MERCHANTS = [
+    "NETFLIX", "SPOTIFY INDIA", "HOTSTAR", "ADOBE SYSTEMS", "GITHUB INC", "CHATGPT SUBSCRIPTION",
+    "CANVA PTY", "NOTION LABS", "MICROSOFT 365", "GOOGLE ONE", "AIRTEL POSTPAID", "JIO FIBER",
+    "BESCOM ELECTRICITY", "LIC INSURANCE", "YOUTUBE PREMIUM", "SMALLCASE", "ZOMATO PRO", "SWIGGY ONE",
+    "AMAZON PRIME", "LINKEDIN PREMIUM", "TATA PLAY RECHARGE", "HDFC MF SIP", "BWSSB WATER", "CULT FIT MEMBERSHIP",
+]
+
+
+def test_many_clean_subscriptions_are_all_detected(detector, tmp_path, monkeypatch):
+    import pipeline
+
+    # The per-request forest, whatever models/ holds on this machine
+    detector.pattern_detector = build_pattern_detector()
+    detector.pattern_model_version = None
+    monkeypatch.setattr(pipeline, "_detector", detector)
+
+    lines = ["Date,Description,Debit,Credit,Balance"]
+    for i, merchant in enumerate(MERCHANTS):
+        # Priced from 99 to about 22,000 so the dearest plans stand out
+        amount = 99 + 1000 * i ** 1.5 / 5
+        for month in range(1, 13):
+            lines.append(f"{1 + i:02d}-{month:02d}-2024,{merchant},{amount:.2f},0.00,100000.00")
+    path = tmp_path / "statement.csv"
+    path.write_text("\n".join(lines) + "\n")
+
+    result = pipeline.analyze_statement_file(str(path))
+    assert len(result["subscriptions"]) == len(MERCHANTS)
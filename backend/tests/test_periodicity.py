@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from columnar import epoch_days
+from periodicity import CADENCES, NONE, detect_periods, next_payment_date
+
+MONTHLY = [c[0] for c in CADENCES].index("Monthly")
+
+
+def periods_of(dates):
+    days = epoch_days(pd.to_datetime(dates))
+    return detect_periods(days, np.array([0, len(days)]))
+
+
+def test_calendar_monthly_keeps_its_day():
+    dates = [f"2024-{m:02d}-05" for m in range(1, 13)]
+    dates[6] = "2024-07-07"
+    periods = periods_of(dates)
+    assert periods["cadence"][0] == MONTHLY
+    assert periods["phase"][0] == 5
+
+
+def test_thirty_day_plan_has_no_phase():
+    dates = pd.Timestamp("2024-01-20") + pd.to_timedelta(np.arange(0, 24 * 30, 30), unit="D")
+    periods = periods_of(dates)
+    assert periods["cadence"][0] == MONTHLY
+    assert periods["phase"][0] == NONE
+
+
+def test_next_date_of_early_payment_stays_on_usual_day():
+    # Usual day 1, paid two days early
+    assert next_payment_date(pd.Timestamp("2024-03-30"), "Monthly", 30.44, 1) == pd.Timestamp("2024-05-01")
+
+
+def test_next_date_of_late_payment_does_not_skip_a_month():
+    # Usual day 30, paid three days late
+    assert next_payment_date(pd.Timestamp("2024-04-02"), "Monthly", 30.44, 30) == pd.Timestamp("2024-04-30")
+
+
+def test_next_date_on_time():
+    assert next_payment_date(pd.Timestamp("2024-01-15"), "Monthly", 30.44, 15) == pd.Timestamp("2024-02-15")
+    assert next_payment_date(pd.Timestamp("2024-01-31"), "Monthly", 30.44, 31) == pd.Timestamp("2024-02-29")
+    assert next_payment_date(pd.Timestamp("2024-01-15"), "Yearly", 365.25, 15) == pd.Timestamp("2025-01-15")
+
+
+def test_next_date_without_phase_adds_the_period():
+    # A drifting 30-day plan: one period after the last payment, not the 6th of next month
+    assert next_payment_date(pd.Timestamp("2025-11-30"), "Monthly", 30.44, NONE) == pd.Timestamp("2025-12-30")
+
+
+def test_next_date_weekly():
+    # 2024-01-03 is a Wednesday (2); paid a day late on Thursday
+    assert next_payment_date(pd.Timestamp("2024-01-04"), "Weekly", 7, 2) == pd.Timestamp("2024-01-10")
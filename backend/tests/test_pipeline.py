@@ -0,0 +1,27 @@
+import pytest
+
+from periodicity import CADENCES, CUSTOM, frequency_label
+from pipeline import interval_frequency, payments_per_year
+
+
+@pytest.mark.parametrize("frequency, expected", [
+    ("Weekly", 52), ("Monthly", 12), ("Quarterly", 4), ("Half-yearly", 2), ("Yearly", 1),
+    ("Every 28 days", 365 / 28), ("Every 84 days", 365 / 84),
+    # Fallbacks: a degenerate custom period and a label that is not a cadence
+    ("Every 0 days", 1), ("Irregular", 1),
+])
+def test_payments_per_year(frequency, expected):
+    assert payments_per_year(frequency) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("code, period", [(code, cadence[1]) for code, cadence in enumerate(CADENCES)]
+                         + [(CUSTOM, 27.6), (CUSTOM, 45.0)])
+def test_rate_matches_the_detected_period(code, period):
+    label = frequency_label(code, period)
+    # Calendar cadences use whole payments a year; custom periods their rounded length
+    assert payments_per_year(label) == pytest.approx(365.25 / period, rel=0.02)
+
+
+@pytest.mark.parametrize("avg_interval", [7, 12, 30, 90, 180, 365, 500])
+def test_rate_matches_the_mean_interval_fallback(avg_interval):
+    assert payments_per_year(interval_frequency(avg_interval)) == pytest.approx(365.25 / avg_interval, rel=0.02)
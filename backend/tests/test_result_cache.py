@@ -0,0 +1,81 @@
+import os
+import time
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, result_key
+
+
+class Clock:
+    """Stands in for time.time; starts at the real time so file mtimes compare sensibly"""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, "time", clock)
+    return clock
+
+
+def test_key_depends_on_content_and_version():
+    assert result_key("abc", "v1") == result_key("abc", "v1")
+    assert result_key("abc", "v1") != result_key("abc", "v2")
+    assert result_key("abc", "v1") != result_key("abd", "v1")
+
+
+def test_memory_entries_expire_after_ttl(clock):
+    cache = ResultCache(max_items=4, ttl=60)
+    cache.put("a", {"n": 1})
+    clock.now += 60
+    assert cache.get("a") == {"n": 1}
+    clock.now += 1
+    assert cache.get("a") is None
+    assert cache.stats()["memory_items"] == 0
+    assert (cache.memory_hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ResultCache(max_items=2, ttl=60)
+    cache.put("a", {"n": 1})
+    cache.put("b", {"n": 2})
+    cache.get("a")
+    cache.put("c", {"n": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"n": 1}
+    assert cache.get("c") == {"n": 3}
+
+
+def test_disk_tier_survives_a_new_process(tmp_path, clock):
+    ResultCache(max_items=2, ttl=60, cache_dir=str(tmp_path)).put("k" * 64, {"n": 1})
+    cache = ResultCache(max_items=2, ttl=60, cache_dir=str(tmp_path))
+    assert cache.get("k" * 64) == {"n": 1}
+    assert cache.disk_hits == 1
+    # Promoted to the memory tier
+    assert cache.get("k" * 64) == {"n": 1}
+    assert cache.memory_hits == 1
+
+
+def test_expired_disk_entries_are_removed(tmp_path, clock):
+    key = "e" * 64
+    ResultCache(ttl=60, cache_dir=str(tmp_path)).put(key, {"n": 1})
+    path = tmp_path / key[:2] / f"{key}.json"
+    os.utime(path, (clock.now - 61, clock.now - 61))
+    cache = ResultCache(ttl=60, cache_dir=str(tmp_path))
+    assert cache.get(key) is None
+    assert not path.exists()
+
+
+def test_memory_tier_can_be_disabled(tmp_path, clock):
+    cache = ResultCache(max_items=0, ttl=60, cache_dir=str(tmp_path))
+    assert cache.enabled
+    cache.put("d" * 64, {"n": 1})
+    assert cache.stats()["memory_items"] == 0
+    assert cache.get("d" * 64) == {"n": 1}
+    assert not ResultCache(max_items=0).enabled
@@ -0,0 +1,90 @@
+import asyncio
+import shutil
+
+import pytest
+
+import pipeline
+from engine import AnalysisEngine
+from ml_detector import SubscriptionDetector
+from result_cache import ResultCache
+from streaming import cached_records, stream_analysis, wants_stream
+
+STATEMENT = """Date,Description,Debit,Credit,Balance
+05-01-2024,NETFLIX,649.00,0.00,10000.00
+09-01-2024,SPOTIFY INDIA,119.00,0.00,10000.00
+15-01-2024,AMAZON PRIME,1499.00,0.00,10000.00
+05-02-2024,NETFLIX,649.00,0.00,10000.00
+09-02-2024,SPOTIFY INDIA,119.00,0.00,10000.00
+05-03-2024,NETFLIX,649.00,0.00,10000.00
+09-03-2024,SPOTIFY INDIA,119.00,0.00,10000.00
+05-04-2024,NETFLIX,649.00,0.00,10000.00
+09-04-2024,SPOTIFY INDIA,119.00,0.00,10000.00
+12-04-2024,TEA STALL,20.00,0.00,10000.00
+15-01-2025,AMAZON PRIME,1499.00,0.00,10000.00
+"""
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(pipeline, "_detector", SubscriptionDetector(text_backend="lite"))
+    engine = AnalysisEngine(workers=0, threads=1, max_pending=4)
+    yield engine
+    engine.shutdown()
+
+
+def collect(engine, path, cache=None, key=None):
+    async def run():
+        return [record async for record in stream_analysis(engine, str(path), cache, key)]
+    return asyncio.run(run())
+
+
+def test_wants_stream():
+    assert wants_stream("application/x-ndjson")
+    assert wants_stream("application/json, application/x-ndjson;q=0.9")
+    assert not wants_stream("application/json")
+    assert not wants_stream(None)
+
+
+def test_records_arrive_in_order_and_totals_match(engine, tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text(STATEMENT)
+    shutil.copy(path, tmp_path / "copy.csv")
+    cache = ResultCache(max_items=4)
+
+    records = collect(engine, path, cache, "key")
+
+    types = [record["type"] for record in records]
+    stages = [record["stage"] for record in records if record["type"] == "stage"]
+    assert stages == pipeline.PIPELINE_STAGES
+    # Every stage record comes before the first item; the summary is the last record
+    assert types.index("item") > max(i for i, t in enumerate(types) if t == "stage")
+    assert types[-1] == "summary" and types.count("summary") == 1
+    # The spooled upload is removed once the analysis finishes
+    assert not path.exists()
+
+    items = [record["item"] for record in records if record["type"] == "item"]
+    plain = pipeline.analyze_statement_file(str(tmp_path / "copy.csv"))
+    assert sorted(item["UnifiedName"] for item in items) == sorted(item["UnifiedName"] for item in plain["subscriptions"])
+    assert records[-1]["insights"] == plain["insights"]
+    assert records[-1]["status"] == plain["status"]
+    # A complete stream is cached in the plain /analyze form
+    assert cache.get("key") == plain
+
+
+def test_cached_payload_replays_as_records():
+    payload = pipeline.build_response([])
+    assert cached_records(payload) == [{"type": "summary", "status": payload["status"],
+                                        "message": payload["message"], "insights": payload["insights"]}]
+    assert cached_records({"error": "Empty file"}) == [{"type": "error", "error": "Empty file"}]
+
+
+def test_a_failed_analysis_ends_with_an_error_record(engine, tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text("Date,Description,Debit\n")
+    cache = ResultCache(max_items=4)
+
+    records = collect(engine, path, cache, "key")
+
+    assert records[-1]["type"] == "error"
+    assert not [record for record in records if record["type"] == "item"]
+    assert cache.get("key") is None
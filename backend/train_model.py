@@ -0,0 +1,84 @@
+"""
+Offline training for the subscription pattern model.
+
+Fits the Isolation Forest on merchant-group features from a corpus of
+statements (data/sample_*.csv plus synthetic ones) and saves it as the next
+versioned artifact in config.PATTERN_MODEL_DIR. The server loads the newest
+artifact at startup (or the one pinned by SUBDETECT_PATTERN_MODEL_VERSION).
+
+Usage:
+    python train_model.py [--data-dir ../data] [--synthetic 300] [--seed 42]
+"""
+import argparse
+import glob
+import os
+from datetime import date, timedelta
+from typing import List
+
+import numpy as np
+
+import config
+from pipeline import load_statement, extract_candidate_features, StatementError
+from ml_detector import build_pattern_detector
+from model_store import save_pattern_model
+from synthetic_data import generate_statement, statement_to_csv
+
+
+def statement_features(raw_content: str) -> List[np.ndarray]:
+    """Feature matrix of the candidate merchant groups in one statement"""
+    try:
+        df = load_statement(raw_content)
+    except StatementError:
+        return []
+    _, features_matrix = extract_candidate_features(df)
+    return [features_matrix]
+
+
+def build_corpus(data_dir: str, n_synthetic: int, seed: int):
+    rows, sources = [], []
+
+    for path in sorted(glob.glob(os.path.join(data_dir, 'sample_*.csv'))):
+        with open(path, encoding='utf-8') as f:
+            rows.extend(statement_features(f.read()))
+        sources.append(os.path.basename(path))
+
+    rng = np.random.default_rng(seed)
+    for _ in range(n_synthetic):
+        months = int(rng.integers(3, 25))
+        # Spread statement end dates over the last ~3 years so days_since_last
+        # covers both fresh uploads and old exports
+        end = date.today() - timedelta(days=int(rng.integers(0, 1100)))
+        statement = generate_statement(
+            months=months,
+            start=end - timedelta(days=30 * months),
+            n_subscriptions=int(rng.integers(2, 10)),
+            noise_per_month=int(rng.integers(5, 40)),
+            seed=int(rng.integers(0, 2**31))
+        )
+        rows.extend(statement_features(statement_to_csv(statement)))
+    if n_synthetic:
+        sources.append(f"synthetic x{n_synthetic} (seed={seed})")
+
+    return (np.vstack(rows) if rows else np.zeros((0, 0))), sources
+
+
+def train(data_dir: str, n_synthetic: int, seed: int) -> str:
+    X, sources = build_corpus(data_dir, n_synthetic, seed)
+    if len(X) < config.PATTERN_MIN_FIT_SAMPLES:
+        raise SystemExit(f"Only {len(X)} merchant groups in corpus, need at least {config.PATTERN_MIN_FIT_SAMPLES}")
+
+    print(f"Fitting pattern model on {len(X)} merchant groups from {len(sources)} sources...")
+    model = build_pattern_detector()
+    model.fit(X)
+    path = save_pattern_model(model, n_samples=len(X), sources=sources)
+    print(f"Saved {path}")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the subscription pattern model")
+    parser.add_argument("--data-dir", default=os.path.join(config.BACKEND_DIR, "..", "data"))
+    parser.add_argument("--synthetic", type=int, default=300, help="Number of synthetic statements")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    train(args.data_dir, args.synthetic, args.seed)
@@ -0,0 +1,99 @@
+"""
+Spooling of uploaded statements to temporary files.
+
+Uploads are copied to disk in fixed-size pieces so the server never holds a
+whole statement in memory; workers then parse the file in chunks by path.
+Zip archives of statements are unpacked the same way, one file at a time.
+"""
+import hashlib
+import os
+import tempfile
+import zipfile
+from typing import List, Tuple
+
+import config
+from formats import is_statement_name
+
+READ_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES"""
+
+
+class TooManyFiles(Exception):
+    """Raised when an archive holds more statements than allowed"""
+
+
+async def spool_upload(file, max_bytes: int = config.MAX_UPLOAD_BYTES) -> Tuple[str, str]:
+    """
+    Copy an UploadFile to a temp file; returns (path, SHA-256 of the content).
+    The caller removes the file.
+    """
+    fd, path = tempfile.mkstemp(prefix="statement-", suffix=".csv", dir=config.UPLOAD_SPOOL_DIR)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                piece = await file.read(READ_SIZE)
+                if not piece:
+                    break
+                size += len(piece)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes // (1024 * 1024)} MB")
+                digest.update(piece)
+                out.write(piece)
+    except BaseException:
+        remove_spooled(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def remove_spooled(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def extract_statement_members(zip_path: str, max_files: int,
+                              max_bytes: int = config.MAX_UPLOAD_BYTES) -> List[Tuple[str, str, str]]:
+    """
+    Spool every statement member (CSV, compressed CSV, Parquet, Arrow; nested
+    zips are skipped) of a zip archive to its own temp file; returns
+    [(member name, path, SHA-256)]. Member sizes are checked while copying,
+    not taken from the archive's headers. On any error the files spooled so
+    far are removed; zipfile.BadZipFile propagates for unreadable archives.
+    """
+    extracted: List[Tuple[str, str, str]] = []
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            for member in archive.infolist():
+                name = member.filename
+                base = os.path.basename(name)
+                if (member.is_dir() or not is_statement_name(base) or base.lower().endswith(".zip")
+                        or base.startswith("._")):
+                    continue
+                if len(extracted) >= max_files:
+                    raise TooManyFiles(f"Archive holds more than {max_files} statements")
+                fd, path = tempfile.mkstemp(prefix="statement-", suffix=".csv", dir=config.UPLOAD_SPOOL_DIR)
+                extracted.append((name, path, ""))
+                digest = hashlib.sha256()
+                size = 0
+                with os.fdopen(fd, "wb") as out, archive.open(member) as source:
+                    while True:
+                        piece = source.read(READ_SIZE)
+                        if not piece:
+                            break
+                        size += len(piece)
+                        if size > max_bytes:
+                            raise UploadTooLarge(f"{name} exceeds {max_bytes // (1024 * 1024)} MB")
+                        digest.update(piece)
+                        out.write(piece)
+                extracted[-1] = (name, path, digest.hexdigest())
+    except BaseException:
+        for _, path, _ in extracted:
+            remove_spooled(path)
+        raise
+    return extracted
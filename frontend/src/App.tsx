@@ -35,7 +35,9 @@ export interface AnalysisInsights {
 
 export interface AnalysisResult {
   subscriptions: Subscription[]
-  insights: AnalysisInsights
+  // null while results are still streaming in
+  insights: AnalysisInsights | null
+  // 'streaming' until the final summary has arrived, 'error' if the stream broke off after some items
   status: string
   message: string
 }
@@ -1,8 +1,9 @@
 import { useState } from 'react'
 import { UploadCloud, FileText, AlertCircle, ShieldCheck } from 'lucide-react'
+import type { AnalysisResult, Subscription } from '../App'
 
 interface FileUploadProps {
-    onAnalyze: (data: any) => void
+    onAnalyze: (data: AnalysisResult) => void
     setLoading: (loading: boolean) => void
     loading: boolean
 }
@@ -24,18 +25,53 @@ export default function FileUpload({ onAnalyze, setLoading, loading }: FileUploa
         formData.append('file', file)
 
         try {
+            // Streamed JSON Lines: each subscription is shown as soon as it is scored
             const response = await fetch('http://localhost:8000/analyze', {
                 method: 'POST',
                 body: formData,
+                headers: { Accept: 'application/x-ndjson' },
             })
 
-            const result = await response.json()
-
-            if (!response.ok) {
-                throw new Error(result.error || 'Failed to analyze')
+            if (!response.ok || !response.body) {
+                const result = await response.json().catch(() => ({}))
+                throw new Error(result.detail || result.error || 'Failed to analyze')
             }
 
-            onAnalyze(result)
+            const subscriptions: Subscription[] = []
+            const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+            let buffered = ''
+            let finished = false
+            try {
+                while (!finished) {
+                    const { value, done } = await reader.read()
+                    if (done) break
+                    buffered += value
+                    const lines = buffered.split('\n')
+                    buffered = lines.pop() ?? ''
+                    for (const line of lines) {
+                        if (!line.trim()) continue
+                        const record = JSON.parse(line)
+                        if (record.type === 'error') {
+                            throw new Error(record.error || 'Failed to analyze')
+                        }
+                        if (record.type === 'item') {
+                            subscriptions.push(record.item)
+                            onAnalyze({ status: 'streaming', message: '', subscriptions: [...subscriptions], insights: null })
+                        }
+                        if (record.type === 'summary') {
+                            onAnalyze({ ...record, subscriptions: [...subscriptions] })
+                            finished = true
+                        }
+                    }
+                }
+                if (!finished) {
+                    throw new Error('Connection closed before the analysis finished')
+                }
+            } catch (err: any) {
+                // Results are already on screen once an item arrived: report the failure there
+                if (subscriptions.length === 0) throw err
+                onAnalyze({ status: 'error', message: err.message, subscriptions: [...subscriptions], insights: null })
+            }
         } catch (err: any) {
             setError(err.message)
         } finally {
@@ -54,13 +90,13 @@ export default function FileUpload({ onAnalyze, setLoading, loading }: FileUploa
                 </div>
                 <h3 className="text-xl font-bold text-slate-900">Upload Bank Statement</h3>
                 <p className="text-slate-500 text-sm mt-2 max-w-[260px] mx-auto leading-relaxed">
-                    Upload your CSV statement to detect hidden recurring payments.
+                    Upload your CSV (or zipped CSV, Parquet, Arrow) statement to detect hidden recurring payments.
                 </p>
             </div>
 
             <input
                 type="file"
-                accept=".csv"
+                accept=".csv,.gz,.zip,.parquet,.pq,.arrow,.arrows,.feather,.ipc"
                 onChange={handleFileChange}
                 className="hidden"
                 id="file-upload"
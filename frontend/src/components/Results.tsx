@@ -37,6 +37,8 @@ export default function Results({ data, onReset }: ResultsProps) {
                     <h2 className="text-2xl font-bold text-gray-900">Analysis Results</h2>
                     <p className="text-sm text-gray-600 mt-1">
                         Found {verifiedSubscriptions.length} subscriptions
+                        {data.status === 'streaming' && ' so far, still analyzing...'}
+                        {data.status === 'error' && ` before the analysis stopped: ${data.message}`}
                     </p>
                 </div>
                 <button